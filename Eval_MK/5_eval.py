@@ -1,84 +1,183 @@
+import ast
 import json
 import os
 import re
 from os import getenv
-from dotenv import load_dotenv
-from neo4j import GraphDatabase
-from neo4j_graphrag.embeddings import OllamaEmbeddings
-from neo4j_graphrag.retrievers import VectorRetriever
-from neo4j_graphrag.llm import OllamaLLM
 
 # --- Initialisierung ---
-load_dotenv(".env")
-db_uri = getenv("db_uri")
-db_name = getenv("db_name")
-db_username = getenv("db_username")
-db_password = getenv("db_password")
-
-auth = (db_username, db_password)
-try:
-    driver = GraphDatabase.driver(uri=db_uri, auth=auth)
-    driver.verify_connectivity()
-    print("Verbindung zu Neo4j erfolgreich hergestellt.")
-except Exception as e:
-    print(f"Fehler bei der Verbindung zu Neo4j: {e}")
-    exit()
-
-# Initialisiere Modelle
-embedder = OllamaEmbeddings(model="nomic-embed-text")
-llm = OllamaLLM(model_name="deepseek-r1:1.5b")
-retriever = VectorRetriever(driver, "nodes", embedder, neo4j_database=db_name)
+# Treiber, Modelle und Retriever werden erst bei der ersten Verwendung erzeugt
+EMBEDDING_MODEL = "nomic-embed-text"
+LLM_MODEL = "deepseek-r1:1.5b"
+SNAPSHOT_PATH = "attack-graph.snapshot"
+# Komprimierte Embeddings aus "python cli.py compress" (embedding_store.py): None durchsucht den vollen Vektorindex,
+# "int8"/"binary" filtern über die Codes im Speicher vor, "index" über den reduzierten Vektorindex
+COMPRESSED_STORAGE = None
+REDUCTION_PATH = "embedding-reduction.npz"
+REDUCED_INDEX = "SDOsReduced"
+# Semantischer Cache für abgerufene Kontexte (semantic_cache.py), None deaktiviert ihn
+# nur mit vorab berechneten Vektoren (pre_embed.py), er verursacht also keinen zusätzlichen Embedding-Aufruf
+SEMANTIC_CACHE_THRESHOLD = None
+SEMANTIC_CACHE_SIZE = 1024
+
+_resources = {}
+
+
+def get_db_name():
+    if "db_name" not in _resources:
+        from dotenv import load_dotenv
+
+        load_dotenv(".env")
+        _resources["db_name"] = getenv("db_name")
+    return _resources["db_name"]
+
+
+def get_driver():
+    if "driver" not in _resources:
+        from dotenv import load_dotenv
+        from neo4j import GraphDatabase
+
+        load_dotenv(".env")
+        auth = (getenv("db_username"), getenv("db_password"))
+        try:
+            driver = GraphDatabase.driver(uri=getenv("db_uri"), auth=auth)
+            driver.verify_connectivity()
+            print("Verbindung zu Neo4j erfolgreich hergestellt.")
+        except Exception as e:
+            print(f"Fehler bei der Verbindung zu Neo4j: {e}")
+            exit()
+        _resources["driver"] = driver
+    return _resources["driver"]
+
+
+def get_llm():
+    if "llm" not in _resources:
+        from neo4j_graphrag.llm import OllamaLLM
+
+        _resources["llm"] = OllamaLLM(model_name=LLM_MODEL)
+    return _resources["llm"]
+
+
+def get_embedder():
+    if "embedder" not in _resources:
+        from neo4j_graphrag.embeddings import OllamaEmbeddings
+
+        _resources["embedder"] = OllamaEmbeddings(model=EMBEDDING_MODEL)
+    return _resources["embedder"]
+
+
+def get_retriever():
+    if "retriever" not in _resources:
+        from domain_shards import DomainRouter
+        from hybrid_retriever import HybridRetriever
+        from stix_graph_snapshot import load_snapshot
+
+        snapshot = load_snapshot(SNAPSHOT_PATH) if os.path.exists(SNAPSHOT_PATH) else None
+        # Domänen-Shards (python cli.py shard --index nodes) werden verwendet, sobald sie existieren
+        router = DomainRouter.for_driver(get_driver(), "nodes", snapshot, neo4j_database=get_db_name())
+        compressed = None
+        if COMPRESSED_STORAGE is not None:
+            from embedding_store import load_compressed_retriever
+
+            compressed = load_compressed_retriever(
+                get_driver(), get_embedder(), COMPRESSED_STORAGE, REDUCTION_PATH, REDUCED_INDEX,
+                neo4j_database=get_db_name()
+            )
+        _resources["retriever"] = HybridRetriever(
+            get_driver(), "nodes", "SDOText", get_embedder(),
+            snapshot=snapshot, neo4j_database=get_db_name(), router=router, compressed=compressed
+        )
+    return _resources["retriever"]
+
+
+def get_semantic_cache():
+    if "semantic_cache" not in _resources:
+        from semantic_cache import SemanticCache
+
+        _resources["semantic_cache"] = SemanticCache(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE) if SEMANTIC_CACHE_THRESHOLD is not None else None
+    return _resources["semantic_cache"]
 
 
 # --- Hilfsfunktionen für RAG ---
 
 def get_neighborhood(driver, node_id):
-    # direkte Nachbarn holen
-    with (driver.session(database=db_name) as session):
+    # direkte Nachbarn holen, mit dem Digest der Beziehung (context_digests.py)
+    with (driver.session(database=get_db_name()) as session):
         result = session.run("""
             MATCH (n)-[r]-(m)
             WHERE elementId(n) = $id OR n.id = $id
-            RETURN DISTINCT m, type(r) AS rel_type
+            RETURN DISTINCT m, type(r) AS rel_type, coalesce(r.digest, r.description) AS rel_description
         """, id=node_id)
-        return [(record["m"], record["rel_type"]) for record in result]
+        return [(record["m"], record["rel_type"], record["rel_description"]) for record in result]
+
+
+def get_node_description(node):
+    # vorberechneter Digest (context_digests.py) statt der vollständigen Beschreibung mit Zitaten
+    return node.get('digest') or node.get('description') or 'Keine Beschreibung verfügbar.'
 
 
 def build_question_context(main_node, neighbors):
     #LLM Kontext-String generieren
     parts = []
-    main_node_desc = main_node.get('description', 'Keine Beschreibung verfügbar.')
+    main_node_desc = get_node_description(main_node)
     parts.append(
         f"Bester Treffer der Suche:\n\"{main_node.get('name')}\" vom Typ \"{main_node.get('type')}\": {main_node_desc}")
 
     if neighbors:
         parts.append("\nNachbarn:")
-        for neighbor, rel_type in neighbors:
-            neighbor_desc = neighbor.get('description', 'Keine Beschreibung verfügbar.')
+        for neighbor, rel_type, rel_desc in neighbors:
+            neighbor_desc = get_node_description(neighbor)
+            rel_text = f"\"{rel_type}\" ({rel_desc})" if rel_desc else f"\"{rel_type}\""
             parts.append(
-                f"Verbunden über \"{rel_type}\" mit \"{neighbor.get('name')}\" vom Typ \"{neighbor.get('type')}\": {neighbor_desc}")
+                f"Verbunden über {rel_text} mit \"{neighbor.get('name')}\" vom Typ \"{neighbor.get('type')}\": {neighbor_desc}")
 
     return "\n".join(parts)
 
 
-def run_rag_query(query_text: str) -> str:
-    # 1. & 2. Ähnlichkeitssuche und Nachbarschaftsabruf
-    try:
-        search_result = retriever.search(query_text=query_text, top_k=1)
-        if not search_result.items:
-            print("Keine relevanten Knoten im Graphen gefunden.")
-            # Fallback-Idee?: ohne Kontext an das LLM senden + Hinweis
-            question_context = "Kein Kontext gefunden. Beantworte die Frage basierend auf deinem allgemeinen Wissen. Gebe bitte aus das du keinen weiteren Kontext dazu bekommen hast."
-        else:
-            main_item_dict = search_result.items[0].metadata
-            neighbors = get_neighborhood(driver, main_item_dict["id"])
-            question_context = build_question_context(main_item_dict, neighbors)
-    except Exception as e:
-        print(f"Fehler bei der RAG-Abfrage: {e}")
-        return "Fehler bei der Abfrage."
-
-    # 3. LLM-Anfrage mit Kontext
+def get_query_vector(query_text):
+    # Vektoren aus der Vorab-Einbettung (pre_embed.py), None -> Embedding-Modell wird verwendet
+    precomputed = _resources.get("precomputed")
+    return precomputed.get(query_text) if precomputed else None
+
+
+def retrieve_context(query_text: str) -> dict:
+    # 1. & 2. Ähnlichkeitssuche und Nachbarschaftsabruf, unabhängig vom Antwort-Modell
+    # bei einer fast gleichen, bereits gestellten Frage kommt der Kontext aus dem semantischen Cache
+    query_vector = get_query_vector(query_text)
+    cache = get_semantic_cache() if query_vector is not None else None
+    if cache is not None:
+        question_context = cache.lookup(query_vector)
+        if question_context is not None:
+            return {"context": question_context, "cache_hit": True}
+
+    question_context = search_question_context(query_text, query_vector)
+    if cache is not None:
+        cache.store(query_vector, question_context)
+    return {"context": question_context, "cache_hit": False}
+
+
+def search_question_context(query_text: str, query_vector=None) -> str:
+    search_result = get_retriever().search(
+        query_text=query_text, top_k=1, query_vector=query_vector
+    )
+    if not search_result.items:
+        print("Keine relevanten Knoten im Graphen gefunden.")
+        # Fallback-Idee?: ohne Kontext an das LLM senden + Hinweis
+        return "Kein Kontext gefunden. Beantworte die Frage basierend auf deinem allgemeinen Wissen. Gebe bitte aus das du keinen weiteren Kontext dazu bekommen hast."
+
+    main_item_dict = ast.literal_eval(search_result.items[0].content)
+    # Nachbarschaft aus dem Snapshot im Speicher (STIX-ID), sonst per Cypher über die elementId
+    snapshot = get_retriever().snapshot
+    if snapshot is not None and snapshot.index_of(main_item_dict.get("id", "")) is not None:
+        neighbors = snapshot.get_neighborhood(main_item_dict["id"])
+    else:
+        neighbors = get_neighborhood(get_driver(), search_result.items[0].metadata["id"])
+    return build_question_context(main_item_dict, neighbors)
+
+
+def answer_question(query_text: str, question_context: str, llm=None) -> str:
+    # 3. LLM-Anfrage mit Kontext, llm Standard: LLM_MODEL
     try:
-        response = llm.invoke(
+        response = (llm or get_llm()).invoke(
             input=query_text,
             system_instruction=question_context
         )
@@ -88,6 +187,16 @@ def run_rag_query(query_text: str) -> str:
         return "Fehler bei der LLM-Antwort."
 
 
+def run_rag_query(query_text: str) -> str:
+    try:
+        retrieved = retrieve_context(query_text)
+    except Exception as e:
+        print(f"Fehler bei der RAG-Abfrage: {e}")
+        return "Fehler bei der Abfrage."
+
+    return answer_question(query_text, retrieved["context"])
+
+
 # --- Benchmark ---
 
 def load_benchmark_data(file_path: str):
@@ -130,9 +239,13 @@ def parse_llm_answer(response: str, choices: list) -> str:
 
 
 def evaluate_task(task_name: str, benchmark_data: list):
+    from pre_embed import eval_query
+
     #Evaluierung der Aufgabe
     correct_predictions = 0
     total_questions = len(benchmark_data)
+    # (Cache-Treffer, korrekt) je Frage für die Auswirkung des semantischen Caches
+    cache_results = []
 
     print(f"\n--- Starte Evaluierung für: {task_name} ---")
 
@@ -142,17 +255,21 @@ def evaluate_task(task_name: str, benchmark_data: list):
         correct_answer_label = item['answer']
 
         # Erstelle den vollständigen Prompt-Text mit Antwortmöglichkeiten
-        full_query = f"{question}\n"
-        for letter, choice_text in choices.items():
-            full_query += f"{letter}) {choice_text}\n"
-        full_query += "Bitte gib deine finale Antwort im Format 'Final Answer: <BUCHSTABE>' an."
+        full_query = eval_query(question, choices)
 
         # Führe die RAG-Abfrage durch
-        llm_response = run_rag_query(full_query)
+        try:
+            retrieved = retrieve_context(full_query)
+            llm_response = answer_question(full_query, retrieved["context"])
+        except Exception as e:
+            print(f"Fehler bei der RAG-Abfrage: {e}")
+            retrieved = {"cache_hit": False}
+            llm_response = "Fehler bei der Abfrage."
 
         # Parse die Antwort
         predicted_answer_label = parse_llm_answer(llm_response, list(choices.keys()))
 
+        cache_results.append((retrieved["cache_hit"], predicted_answer_label == correct_answer_label))
         if predicted_answer_label == correct_answer_label:
             correct_predictions += 1
             print(
@@ -166,12 +283,24 @@ def evaluate_task(task_name: str, benchmark_data: list):
     print(f"\n--- Ergebnis für {task_name} ---")
     print(f"Korrekte Antworten: {correct_predictions} von {total_questions}")
     print(f"Genauigkeit (Accuracy): {accuracy:.2f}%")
+    print_cache_impact(cache_results)
 
     return accuracy
 
-def main():
-    #Bench-Pfad
-    benchmark_base_path = './AttackSeqBench/dataset'
+
+def print_cache_impact(cache_results):
+    # Trefferquote des semantischen Caches und Genauigkeit getrennt nach Cache-Treffer / eigener Suche
+    if get_semantic_cache() is None or not cache_results:
+        return
+    hits = [correct for cache_hit, correct in cache_results if cache_hit]
+    misses = [correct for cache_hit, correct in cache_results if not cache_hit]
+    print(f"Semantischer Cache: {len(hits)} von {len(cache_results)} Kontexten aus dem Cache ({len(hits) / len(cache_results) * 100:.2f}%)")
+    if hits:
+        print(f"Genauigkeit mit Cache-Kontext: {sum(hits) / len(hits) * 100:.2f}%")
+    if misses:
+        print(f"Genauigkeit mit eigener Suche: {sum(misses) / len(misses) * 100:.2f}%")
+
+def main(benchmark_base_path='./AttackSeqBench/dataset'):
 
     tasks = {
         "AttackSeq-Tactic": "attackseq-tactic.json",
@@ -185,6 +314,9 @@ def main():
         file_path = os.path.join(benchmark_base_path, file_name)
         data = load_benchmark_data(file_path)
         if data:
+            from pre_embed import PrecomputedEmbeddings
+
+            _resources["precomputed"] = PrecomputedEmbeddings.for_dataset(file_path, EMBEDDING_MODEL)
             accuracy = evaluate_task(task_name, data)
             results[task_name] = accuracy
 
@@ -192,8 +324,14 @@ def main():
     for task_name, accuracy in results.items():
         print(f"{task_name}: {accuracy:.2f}% Genauigkeit")
 
-    driver.close()
+    if get_semantic_cache() is not None:
+        print(f"Semantischer Cache gesamt: {get_semantic_cache().stats()}")
+
+    if "driver" in _resources:
+        _resources["driver"].close()
     print("\nEvaluierung abgeschlossen und Verbindung zu Neo4j geschlossen.")
 
+# Start im Wurzelverzeichnis des Repositorys (dort liegen die gemeinsamen Module):
+# python -m Eval_MK.5_eval oder python cli.py run eval
 if __name__ == "__main__":
     main()
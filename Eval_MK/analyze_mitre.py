@@ -206,10 +206,15 @@ def print_formatted_table(metrics_results):
 
     print("=" * total_width)
 
-metrics_results = calculate_metrics('evaluation_results.csv')
+def main(df_path='evaluation_results.csv'):
+    metrics_results = calculate_metrics(df_path)
 
-if metrics_results:
-    print_formatted_table(metrics_results)
+    if metrics_results:
+        print_formatted_table(metrics_results)
+
+
+if __name__ == "__main__":
+    main()
 
 """
 #-#Metrik-Spalten#-#
@@ -1,28 +1,106 @@
-from neo4j import GraphDatabase
-from neo4j_graphrag.llm import OllamaLLM
-from neo4j_graphrag.embeddings import OllamaEmbeddings
-from neo4j_graphrag.retrievers import Text2CypherRetriever, VectorRetriever
 import csv, time
 import ast
+import os
 
 # Insert your Neo4j instance URL and credentials
 URI = "neo4j+s://6224f1f3.databases.neo4j.io"
 AUTH = ("neo4j", "DBy7vuJuvsbib8F3FRhIXzIFu5vsgPxs31gJoANwMlo")
 
-driver = GraphDatabase.driver(URI, auth=AUTH)
-
 # ollama run ollama run gemma3:27b-it-q8_0
-llm = OllamaLLM(model_name="gemma3:27b-it-qat")
+LLM_MODEL = "gemma3:27b-it-qat"
 
 # ollama run rjmalagon/gte-qwen2-7b-instruct:f16
-embedder = OllamaEmbeddings(model="rjmalagon/gte-qwen2-7b-instruct:f16")
+EMBEDDING_MODEL = "rjmalagon/gte-qwen2-7b-instruct:f16"
 
+# Optional precomputed lookups, see stix_graph_snapshot.py and technique_sequence_index.py
+SNAPSHOT_PATH = "attack-graph.snapshot"
+SEQUENCE_INDEX_PATH = "attack-sequence-index.json"
+
+# Compressed embeddings from "python cli.py compress", see embedding_store.py: None searches the full vector index,
+# "int8"/"binary" shortlist on the in-memory codes, "index" on the reduced vector index
+COMPRESSED_STORAGE = None
+REDUCTION_PATH = "embedding-reduction.npz"
+REDUCED_INDEX = "SDOsReduced"
+
+# Semantic cache for retrieved graph contexts, see semantic_cache.py; None disables it
+# It is only consulted for precomputed query vectors (pre_embed.py), so it never adds an embedding call
+SEMANTIC_CACHE_THRESHOLD = None
+SEMANTIC_CACHE_SIZE = 1024
+
+# Driver, models and lookups are created on first use, not at import
+_resources = {}
+
+
+def get_driver():
+    if "driver" not in _resources:
+        from neo4j import GraphDatabase
+
+        _resources["driver"] = GraphDatabase.driver(URI, auth=AUTH)
+    return _resources["driver"]
+
+
+def get_llm():
+    if "llm" not in _resources:
+        from neo4j_graphrag.llm import OllamaLLM
+
+        _resources["llm"] = OllamaLLM(model_name=LLM_MODEL)
+    return _resources["llm"]
+
+
+def get_embedder():
+    if "embedder" not in _resources:
+        from neo4j_graphrag.embeddings import OllamaEmbeddings
+
+        _resources["embedder"] = OllamaEmbeddings(model=EMBEDDING_MODEL)
+    return _resources["embedder"]
+
+
+def get_retriever():
+    if "retriever" not in _resources:
+        from domain_shards import DomainRouter
+        from hybrid_retriever import HybridRetriever
+        from stix_graph_snapshot import load_snapshot
+
+        snapshot = load_snapshot(SNAPSHOT_PATH) if os.path.exists(SNAPSHOT_PATH) else None
+        # Per-domain shards are used once built (python cli.py shard), otherwise the router is None
+        router = DomainRouter.for_driver(get_driver(), "SDOs", snapshot)
+        compressed = None
+        if COMPRESSED_STORAGE is not None:
+            from embedding_store import load_compressed_retriever
+
+            compressed = load_compressed_retriever(get_driver(), get_embedder(), COMPRESSED_STORAGE, REDUCTION_PATH, REDUCED_INDEX)
+        _resources["retriever"] = HybridRetriever(get_driver(), "SDOs", "SDOText", get_embedder(), snapshot=snapshot,
+                                                  router=router, compressed=compressed)
+    return _resources["retriever"]
+
+
+def get_sequence_index():
+    if "sequence_index" not in _resources:
+        from technique_sequence_index import load_sequence_index
+
+        _resources["sequence_index"] = load_sequence_index(SEQUENCE_INDEX_PATH) if os.path.exists(SEQUENCE_INDEX_PATH) else None
+    return _resources["sequence_index"]
+
+
+def get_semantic_cache():
+    if "semantic_cache" not in _resources:
+        from semantic_cache import SemanticCache
+
+        _resources["semantic_cache"] = SemanticCache(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE) if SEMANTIC_CACHE_THRESHOLD is not None else None
+    return _resources["semantic_cache"]
 
-def query_vector_sim_txt2cypher_approach(
-    query: str, a: str, b: str, c: str, d: str, vector_retrieval_top_k: int = 10
-) -> str:
-    vector_retriever = VectorRetriever(driver, "SDOs", embedder)
-    result = vector_retriever.search(query_text=query, top_k=vector_retrieval_top_k)
+
+def get_query_vector(query):
+    # Vectors from the pre-embedding stage (pre_embed.py), None falls back to the embedder
+    precomputed = _resources.get("precomputed")
+    return precomputed.get(query) if precomputed else None
+
+
+#graph retrieval: hybrid search and Text2Cypher, the part served by the semantic cache
+def retrieve_graph_context(query: str, query_vector=None, vector_retrieval_top_k: int = 10) -> dict:
+    result = get_retriever().search(
+        query_text=query, top_k=vector_retrieval_top_k, query_vector=query_vector
+    )
 
     nodes_str = ""
     for item in result.items:
@@ -92,8 +170,10 @@ def query_vector_sim_txt2cypher_approach(
     Cypher query:
     """
 
+    from neo4j_graphrag.retrievers import Text2CypherRetriever
+
     txt2cypher_retriever = Text2CypherRetriever(
-        driver=driver, llm=llm, neo4j_schema=SCHEMA, custom_prompt=PROMPT
+        driver=get_driver(), llm=get_llm(), neo4j_schema=SCHEMA, custom_prompt=PROMPT
     )
 
     result = txt2cypher_retriever.search(
@@ -109,13 +189,44 @@ def query_vector_sim_txt2cypher_approach(
     if result.metadata:
         cypher = result.metadata.get("cypher")
 
-    SYSTEM_INSTRUCTION = "Answer the user question using the provided context, which has been retrieved from a graph using the provided Cypher query. Answer only with one char A, B, C or D. Do not explain."
-    final_prompt = f"""Cypher Query:
-{cypher}
+    return {"cypher": cypher, "context": context_str}
+
+
+#retrieval stage: graph context (cached) and sequence context, independent of the answer model
+def retrieve_context(
+    query: str, a: str, b: str, c: str, d: str, vector_retrieval_top_k: int = 10
+) -> dict:
+    query_vector = get_query_vector(query)
+    cache = get_semantic_cache() if query_vector is not None else None
+    graph_context = cache.lookup(query_vector) if cache is not None else None
+
+    cache_hit = graph_context is not None
+    if not cache_hit:
+        graph_context = retrieve_graph_context(query, query_vector, vector_retrieval_top_k)
+        if cache is not None:
+            cache.store(query_vector, graph_context)
+
+    # The sequence context depends on the answer options, so it is not cached
+    context_str = ""
+    sequence_index = get_sequence_index()
+    sequence_context = sequence_index.sequence_context([a, b, c, d]) if sequence_index else ""
+    if sequence_context:
+        context_str += sequence_context + "\n"
+    context_str += graph_context["context"]
+
+    return {"query": query, "cypher": graph_context["cypher"], "context": context_str, "cache_hit": cache_hit}
+
+
+SYSTEM_INSTRUCTION = "Answer the user question using the provided context, which has been retrieved from a graph using the provided Cypher query. Answer only with one char A, B, C or D. Do not explain."
+
+
+def build_prompt(retrieved: dict, a: str, b: str, c: str, d: str) -> str:
+    return f"""Cypher Query:
+{retrieved["cypher"]}
 Context:
-{context_str}
+{retrieved["context"]}
 Question:
-{query}
+{retrieved["query"]}
 
 Possible answers:
 A - {a}
@@ -126,42 +237,69 @@ D - {d}
 Answer:
 """
 
+
+#answer stage, llm defaults to LLM_MODEL
+def answer_question(retrieved: dict, a: str, b: str, c: str, d: str, llm=None) -> str:
+    final_prompt = build_prompt(retrieved, a, b, c, d)
+
     print(final_prompt)
 
     result = str(
-        llm.invoke(input=final_prompt, system_instruction=SYSTEM_INSTRUCTION).content
+        (llm or get_llm()).invoke(input=final_prompt, system_instruction=SYSTEM_INSTRUCTION).content
     )
     print(result)
     return result
 
 
-with open(
-    "../AttackSeq-Technique.csv", mode="r", newline="", encoding="utf-8"
-) as infile, open("approach4.csv", mode="w", newline="", encoding="utf-8") as outfile:
+def query_vector_sim_txt2cypher_approach(
+    query: str, a: str, b: str, c: str, d: str, vector_retrieval_top_k: int = 10
+) -> str:
+    retrieved = retrieve_context(query, a, b, c, d, vector_retrieval_top_k)
+    return answer_question(retrieved, a, b, c, d)
+
+
+def main(input_path, output_path):
+    from pre_embed import PrecomputedEmbeddings
+
+    _resources["precomputed"] = PrecomputedEmbeddings.for_dataset(input_path, EMBEDDING_MODEL)
+
+    with open(input_path, mode="r", newline="", encoding="utf-8") as infile, open(
+        output_path, mode="w", newline="", encoding="utf-8"
+    ) as outfile:
+
+        reader = csv.DictReader(infile)
+        fieldnames = ["Question ID", "Answer", "Latency", "Cache Hit"]
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+        writer.writeheader()
+
+        for row in reader:
+            question_id = row.get("Question ID", "")
+            question_text = row.get("Question", "")
+
+            a = row.get("A", "")
+            b = row.get("B", "")
+            c = row.get("C", "")
+            d = row.get("D", "")
 
-    reader = csv.DictReader(infile)
-    fieldnames = ["Question ID", "Answer", "Latency"]
-    writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-    writer.writeheader()
+            print(f"---------- {question_id} ----------")
 
-    for row in reader:
-        question_id = row.get("Question ID", "")
-        question_text = row.get("Question", "")
+            try:
+                start_time = time.time()
+                retrieved = retrieve_context(question_text, a, b, c, d)
+                answer = answer_question(retrieved, a, b, c, d)
+                latency = round(time.time() - start_time, 4)
 
-        a = row.get("A", "")
-        b = row.get("B", "")
-        c = row.get("C", "")
-        d = row.get("D", "")
+                writer.writerow(
+                    {"Question ID": question_id, "Answer": answer, "Latency": latency, "Cache Hit": retrieved["cache_hit"]}
+                )
+            except Exception as e:
+                print(f"Error processing {question_id}: {e}")
 
-        print(f"---------- {question_id} ----------")
+    cache = get_semantic_cache()
+    if cache is not None:
+        print(f"Semantic cache: {cache.stats()}")
 
-        try:
-            start_time = time.time()
-            answer = query_vector_sim_txt2cypher_approach(question_text, a, b, c, d)
-            latency = round(time.time() - start_time, 4)
 
-            writer.writerow(
-                {"Question ID": question_id, "Answer": answer, "Latency": latency}
-            )
-        except Exception as e:
-            print(f"Error processing {question_id}: {e}")
+# Run from the repository root (the shared modules live there): python -m approach4.post or python cli.py run post
+if __name__ == "__main__":
+    main("AttackSeq-Technique.csv", "approach4/approach4.csv")
@@ -0,0 +1,17 @@
+import re
+
+
+#constants shared by the retrieval modules, kept free of numpy, neo4j and the snapshot so importing them is cheap
+
+TECHNIQUE_ID_PATTERN = re.compile(r"\b(T\d{4}(?:\.\d{3})?)\b")
+#every ATT&CK ID: techniques, tactics (TA), mitigations (M), groups (G), software (S), campaigns (C), data sources (DS)
+ATTACK_ID_PATTERN = re.compile(r"\b(T\d{4}(?:\.\d{3})?|TA\d{4}|M\d{4}|G\d{4}|S\d{4}|C\d{4}|DS\d{4})\b")
+
+#node properties holding embeddings, see embedding_store.py
+REDUCED_PROPERTY = "embedding_reduced"
+INT8_PROPERTY = "embedding_int8"
+INT8_SCALE_PROPERTY = "embedding_int8_scale"
+BINARY_PROPERTY = "embedding_binary"
+EMBEDDING_PROPERTIES = ("embedding", REDUCED_PROPERTY, INT8_PROPERTY, INT8_SCALE_PROPERTY, BINARY_PROPERTY)
+#map projection of a node without its embeddings, so retrieval results do not carry ~14 KB per node
+NODE_WITHOUT_EMBEDDINGS = "n {.*, " + ", ".join(f"{name}: null" for name in EMBEDDING_PROPERTIES) + "}"
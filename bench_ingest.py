@@ -0,0 +1,163 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+
+#ingestion benchmark for stix_to_neo.py on synthetic ATT&CK-shaped bundles (see synthetic_stix.py)
+#every scale is measured in a fresh process so the peak RSS of one scale does not leak into the next,
+#the validator gets a process of its own as well, its peak would otherwise mask the loader stages
+#stix2validator checks roughly 180 objects/s, so by default only scales up to 1x are validated
+
+
+#in-memory stand-in for a Neo4j session: MERGE/SET results are kept in dicts keyed by the statement,
+#so the loader does the same Python-side work as against a real database
+class MemorySession:
+
+    def __init__(self):
+        self.statements = 0
+        self.properties = {}
+
+    def run(self, query, **parameters):
+        self.statements += 1
+        self.properties[query] = parameters.get("properties")
+
+
+def get_peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def timed(results, stage, func, object_count=None):
+    #ru_maxrss is the peak of the whole process, so every stage also reports how much it raised that peak
+    peak_before = get_peak_rss_mb()
+    start = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - start
+    count = object_count(value) if object_count else None
+    peak_after = get_peak_rss_mb()
+    results.append({
+        "stage": stage,
+        "seconds": round(seconds, 4),
+        "objects": count,
+        "objects_per_second": round(count / seconds) if count and seconds else None,
+        "peak_rss_mb": peak_after,
+        "peak_rss_growth_mb": round(peak_after - peak_before, 1),
+    })
+    return value
+
+
+def validate_bundle_file(path, object_count):
+    try:
+        from stix2validator import validate_file
+    except ImportError:
+        return {"stage": "validate", "skipped": "stix2validator not installed"}
+
+    results = []
+    timed(results, "validate", lambda: validate_file(path), lambda _: object_count)
+    return results[0]
+
+
+def run_stages(path, session_factory):
+    from stix_records import read_records, create_record_indexes
+    from stix_to_neo import load_sdos, load_sros, load_embedded_relationships, get_embedded_relationship_properties
+
+    results = []
+    records = timed(results, "parse", lambda: read_records(path), len)
+
+    sdos = [rec for rec in records if rec.type not in ("relationship", "x-mitre-collection")]
+    sros = [rec for rec in records if rec.type == "relationship"]
+    embedded_count = len(get_embedded_relationship_properties(records))
+
+    with session_factory() as session:
+        create_record_indexes(session, [rec.label for rec in sdos])
+        timed(results, "load_sdos", lambda: load_sdos(session, records), lambda _: len(sdos))
+        timed(results, "load_sros", lambda: load_sros(session, records), lambda _: len(sros))
+        timed(results, "load_embedded_relationships", lambda: load_embedded_relationships(session, records), lambda _: embedded_count)
+
+    return results
+
+
+def generate_bundle_file(path, scale, seed):
+    from synthetic_stix import write_bundle
+
+    start = time.perf_counter()
+    object_count = write_bundle(path, scale, seed)
+    return object_count, round(time.perf_counter() - start, 4)
+
+
+def measure_bundle_file(path, use_neo4j):
+    if use_neo4j:
+        from stix_to_neo import get_driver, get_db_name
+
+        session_factory = lambda: get_driver().session(database=get_db_name())
+    else:
+        from contextlib import nullcontext
+
+        session_factory = lambda: nullcontext(MemorySession())
+
+    return run_stages(path, session_factory)
+
+
+def benchmark_scale(scale, seed, validate_bundle, use_neo4j, work_dir):
+    context = multiprocessing.get_context("spawn")
+    path = os.path.join(work_dir, f"synthetic-enterprise-{scale:g}x.json")
+
+    #generating, validating and loading run in separate processes, so each peak RSS is the stage's own
+    with context.Pool(1) as pool:
+        object_count, generate_seconds = pool.apply(generate_bundle_file, (path, scale, seed))
+    validation = {"stage": "validate", "skipped": "above --validate-max-scale"}
+    if validate_bundle:
+        with context.Pool(1) as pool:
+            validation = pool.apply(validate_bundle_file, (path, object_count))
+    with context.Pool(1) as pool:
+        results = pool.apply(measure_bundle_file, (path, use_neo4j))
+    os.remove(path)
+
+    return {
+        "scale": scale,
+        "objects": object_count,
+        "generate_seconds": generate_seconds,
+        "stages": results[:1] + [validation] + results[1:],
+    }
+
+
+def print_report(report):
+    print(f"\n--- {report['scale']:g}x enterprise: {report['objects']} objects (generated in {report['generate_seconds']}s) ---")
+    print(f"{'stage':<30}{'seconds':>10}{'objects':>10}{'objects/s':>12}{'peak RSS MB':>14}{'+MB':>8}")
+    for stage in report["stages"]:
+        if "skipped" in stage:
+            print(f"{stage['stage']:<30}skipped: {stage['skipped']}")
+            continue
+        print(f"{stage['stage']:<30}{stage['seconds']:>10}{stage['objects'] or '':>10}"
+              f"{stage['objects_per_second'] or '':>12}{stage['peak_rss_mb']:>14}{stage['peak_rss_growth_mb']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark STIX ingestion on synthetic ATT&CK bundles")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-validate", action="store_true")
+    parser.add_argument("--validate-max-scale", type=float, default=1,
+                        help="largest scale that is validated, stix2validator needs hours for 100x")
+    parser.add_argument("--neo4j", action="store_true", help="load into the Neo4j instance from .env instead of the in-memory sink")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    reports = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for scale in args.scales:
+            validate_bundle = not args.no_validate and scale <= args.validate_max_scale
+            report = benchmark_scale(scale, args.seed, validate_bundle, args.neo4j, work_dir)
+            print_report(report)
+            reports.append(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
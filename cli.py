@@ -0,0 +1,283 @@
+import argparse
+import importlib
+
+
+#every subcommand imports and connects only what it needs, so e.g. "analyze" works without neo4j or Ollama
+
+
+def load(args):
+    from stix_to_neo import load_stix_to_neo4j, close_driver
+
+    for path in args.paths:
+        load_stix_to_neo4j(path, validate_bundle=not args.no_validate)
+    close_driver()
+
+
+def export(args):
+    import json
+    from stix_to_neo import export_admin_import
+
+    embeddings = None
+    if args.embeddings:
+        with open(args.embeddings, encoding="utf-8") as f:
+            embeddings = json.load(f)
+
+    print(export_admin_import(args.paths, args.out, embeddings, args.database))
+
+
+def digest(args):
+    from context_digests import refresh_all_digests
+    from stix_to_neo import get_driver, get_db_name, close_driver
+
+    print(refresh_all_digests(get_driver(), args.batch_size, neo4j_database=get_db_name()))
+    close_driver()
+
+
+def snapshot(args):
+    from stix_graph_snapshot import save_snapshot
+    from technique_sequence_index import build_sequence_index
+
+    graph_snapshot = save_snapshot(args.paths, args.out)
+    build_sequence_index(graph_snapshot).save(args.sequence_index)
+
+
+def embed(args):
+    from neo4j_graphrag.embeddings import OllamaEmbeddings
+    from embed_sdos import create_indexes, embed_sdos
+    from stix_to_neo import get_driver, get_db_name, close_driver
+
+    driver = get_driver()
+    create_indexes(driver, args.index, args.dimensions, neo4j_database=get_db_name())
+    embed_sdos(driver, OllamaEmbeddings(model=args.model), args.with_relationships, neo4j_database=get_db_name())
+    close_driver()
+
+
+def dump_embeddings(args):
+    from embed_sdos import dump_embeddings as dump
+    from stix_to_neo import get_driver, get_db_name, close_driver
+
+    print(f"{dump(get_driver(), args.out, neo4j_database=get_db_name())} embeddings written to {args.out}")
+    close_driver()
+
+
+def shard(args):
+    from domain_shards import label_domains, create_domain_indexes
+    from stix_to_neo import get_driver, get_db_name, close_driver
+
+    driver = get_driver()
+    print(label_domains(driver, domains=args.domains, neo4j_database=get_db_name()))
+    create_domain_indexes(driver, args.index, args.dimensions, args.domains, neo4j_database=get_db_name())
+    close_driver()
+
+
+def fulltext_index(args):
+    from hybrid_retriever import create_fulltext_index
+    from stix_to_neo import get_driver, get_db_name, close_driver
+
+    create_fulltext_index(get_driver(), args.name, args.label, neo4j_database=get_db_name())
+    close_driver()
+
+
+def compress(args):
+    from embedding_store import (Reduction, FullVectors, fetch_embeddings, get_full_vectors_path,
+                                 store_compressed_embeddings, drop_full_embeddings)
+    from stix_to_neo import get_driver, get_db_name, close_driver
+
+    driver = get_driver()
+    element_ids, vectors = fetch_embeddings(driver, neo4j_database=get_db_name())
+    reduction = Reduction.fit(vectors, args.dimensions, args.method)
+    reduction.save(args.reduction)
+    #the re-rank vectors live next to the reduction, not in the node store
+    FullVectors(element_ids, vectors).save(get_full_vectors_path(args.reduction))
+    store_compressed_embeddings(driver, element_ids, vectors, reduction, args.storage, args.index, neo4j_database=get_db_name())
+    if args.drop_full:
+        print(f"{drop_full_embeddings(driver, args.full_index, neo4j_database=get_db_name())} full embeddings removed")
+    close_driver()
+
+
+def embedding_report(args):
+    import csv
+    from embedding_store import run_report
+    from stix_to_neo import get_driver, get_db_name, close_driver
+
+    rows = run_report(get_driver(), args.model, args.questions, args.top_k, args.method, neo4j_database=get_db_name())
+    close_driver()
+
+    if args.output:
+        with open(args.output, mode="w", newline="", encoding="utf-8") as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def pre_embed(args):
+    from pre_embed import pre_embed_dataset
+
+    for path in args.datasets:
+        print(pre_embed_dataset(path, args.model, args.batch_size, variants=args.variants))
+
+
+def configure_cache(module, args):
+    if args.no_cache:
+        module.SEMANTIC_CACHE_THRESHOLD = None
+    elif args.cache_threshold is not None:
+        module.SEMANTIC_CACHE_THRESHOLD = args.cache_threshold
+
+
+def configure_storage(module, args):
+    module.COMPRESSED_STORAGE = args.compressed
+    module.REDUCTION_PATH = args.reduction
+    module.REDUCED_INDEX = args.reduced_index
+
+
+def run(args):
+    if args.approach == "eval":
+        module = importlib.import_module("Eval_MK.5_eval")
+        configure_cache(module, args)
+        configure_storage(module, args)
+        module.main(args.input or "./AttackSeqBench/dataset")
+    else:
+        module = importlib.import_module(f"approach4.{args.approach}")
+        configure_cache(module, args)
+        configure_storage(module, args)
+        #approach4/approach4_pre.csv and _post.csv are committed results, the default output does not overwrite them
+        module.main(args.input or "AttackSeq-Technique.csv", args.output or "approach4/approach4.csv")
+
+
+def sweep(args):
+    from sweep import RETRIEVERS, run_sweep
+
+    for retriever in args.retrievers:
+        module = importlib.import_module(RETRIEVERS[retriever])
+        configure_cache(module, args)
+        configure_storage(module, args)
+    run_sweep(args.input, args.retrievers, args.models, args.prompts, args.output, args.contexts, args.skip_retrieval)
+
+
+def analyze(args):
+    from Eval_MK.analyze_mitre import main
+
+    main(args.path)
+
+
+def add_cache_arguments(parser):
+    parser.add_argument("--cache-threshold", type=float, help="enable the semantic retrieval cache (off by default) at this cosine similarity, "
+                        "it is only used for questions with pre-embed vectors")
+    parser.add_argument("--no-cache", action="store_true", help="disable the semantic retrieval cache")
+
+
+def add_storage_arguments(parser):
+    parser.add_argument("--compressed", choices=["int8", "binary", "index"],
+                        help="vector search on the compressed embeddings of cli.py compress instead of the full index")
+    parser.add_argument("--reduction", default="embedding-reduction.npz", help="reduction saved by cli.py compress")
+    parser.add_argument("--reduced-index", default="SDOsReduced", help="vector index on the reduced embeddings")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="STIX 2.1 ATT&CK knowledge graph and RAG benchmark tools")
+    subparsers = parser.add_subparsers(required=True)
+
+    load_parser = subparsers.add_parser("load", help="validate and load STIX bundles into Neo4j")
+    load_parser.add_argument("paths", nargs="+")
+    load_parser.add_argument("--no-validate", action="store_true")
+    load_parser.set_defaults(func=load)
+
+    export_parser = subparsers.add_parser("export", help="export STIX bundles as neo4j-admin import files")
+    export_parser.add_argument("paths", nargs="+")
+    export_parser.add_argument("--out", default="neo4j-import")
+    export_parser.add_argument("--embeddings", help="JSON file mapping STIX ids to embedding vectors, written by dump-embeddings")
+    export_parser.add_argument("--database", default="neo4j")
+    export_parser.set_defaults(func=export)
+
+    digest_parser = subparsers.add_parser("digest", help="build or refresh the description digests after loading")
+    digest_parser.add_argument("--batch-size", type=int, default=500)
+    digest_parser.set_defaults(func=digest)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="build the in-memory graph snapshot and sequence index")
+    snapshot_parser.add_argument("paths", nargs="+")
+    snapshot_parser.add_argument("--out", default="attack-graph.snapshot")
+    snapshot_parser.add_argument("--sequence-index", default="attack-sequence-index.json")
+    snapshot_parser.set_defaults(func=snapshot)
+
+    embed_parser = subparsers.add_parser("embed", help="create the vector/full-text indexes and embed all SDOs")
+    embed_parser.add_argument("--index", default="SDOs")
+    embed_parser.add_argument("--model", default="rjmalagon/gte-qwen2-7b-instruct:f16")
+    embed_parser.add_argument("--dimensions", type=int, default=3584)
+    embed_parser.add_argument("--with-relationships", action="store_true")
+    embed_parser.set_defaults(func=embed)
+
+    dump_parser = subparsers.add_parser("dump-embeddings", help="write the embeddings of the graph as a STIX id -> vector JSON for export")
+    dump_parser.add_argument("--out", default="embeddings.json")
+    dump_parser.set_defaults(func=dump_embeddings)
+
+    fulltext_parser = subparsers.add_parser("fulltext-index", help="create only the full-text index of the hybrid retriever")
+    fulltext_parser.add_argument("--name", default="SDOText")
+    fulltext_parser.add_argument("--label", default="SDO")
+    fulltext_parser.set_defaults(func=fulltext_index)
+
+    shard_parser = subparsers.add_parser("shard", help="label SDOs by ATT&CK domain and create per-domain vector indexes")
+    shard_parser.add_argument("--index", default="SDOs", help="combined vector index the shards are named after")
+    shard_parser.add_argument("--dimensions", type=int, default=3584)
+    shard_parser.add_argument("--domains", nargs="+", default=["enterprise-attack", "mobile-attack", "ics-attack"])
+    shard_parser.set_defaults(func=shard)
+
+    compress_parser = subparsers.add_parser("compress", help="store reduced and quantized copies of the SDO embeddings")
+    compress_parser.add_argument("--dimensions", type=int, default=512)
+    compress_parser.add_argument("--method", choices=["pca", "truncate"], default="pca")
+    compress_parser.add_argument("--reduction", default="embedding-reduction.npz", help="where to save the fitted reduction")
+    compress_parser.add_argument("--storage", choices=["int8", "binary", "index"], default="int8",
+                                 help="representation written to the nodes, the same value is passed to run/sweep --compressed")
+    compress_parser.add_argument("--index", default="SDOsReduced", help="vector index on the reduced embeddings (--storage index)")
+    compress_parser.add_argument("--drop-full", action="store_true",
+                                 help="remove the full embeddings and their vector index/shards from the store afterwards, "
+                                      "embed, shard and compress then need a new embed run")
+    compress_parser.add_argument("--full-index", default="SDOs", help="full-dimension vector index dropped by --drop-full")
+    compress_parser.set_defaults(func=compress)
+
+    report_parser = subparsers.add_parser("embedding-report", help="recall vs. latency of the compressed embeddings")
+    report_parser.add_argument("--questions", default="AttackSeq-Technique.csv")
+    report_parser.add_argument("--model", default="rjmalagon/gte-qwen2-7b-instruct:f16")
+    report_parser.add_argument("--method", choices=["pca", "truncate"], default="pca")
+    report_parser.add_argument("--top-k", type=int, default=10)
+    report_parser.add_argument("--output", help="also write the report to this CSV file")
+    report_parser.set_defaults(func=embedding_report)
+
+    pre_embed_parser = subparsers.add_parser("pre-embed", help="embed all benchmark query variants upfront")
+    pre_embed_parser.add_argument("datasets", nargs="+", help="AttackSeq-*.csv files or AttackSeqBench JSON tasks")
+    pre_embed_parser.add_argument("--model", default="rjmalagon/gte-qwen2-7b-instruct:f16")
+    pre_embed_parser.add_argument("--batch-size", type=int, default=64)
+    pre_embed_parser.add_argument("--variants", nargs="+", choices=["question", "choices", "eval"],
+                                  help="query variants to embed, default: the ones the runners read with --model "
+                                       "(question/choices for approach4, eval for 5_eval)")
+    pre_embed_parser.set_defaults(func=pre_embed)
+
+    run_parser = subparsers.add_parser("run", help="run a benchmark approach")
+    run_parser.add_argument("approach", choices=["pre", "post", "eval"])
+    run_parser.add_argument("--input")
+    run_parser.add_argument("--output")
+    add_cache_arguments(run_parser)
+    add_storage_arguments(run_parser)
+    run_parser.set_defaults(func=run)
+
+    sweep_parser = subparsers.add_parser("sweep", help="retrieve once per question, then answer with every model and prompt")
+    sweep_parser.add_argument("--input", default="AttackSeq-Technique.csv", help="AttackSeq-*.csv file or AttackSeqBench JSON task")
+    sweep_parser.add_argument("--retrievers", nargs="+", choices=["pre", "post", "eval"], default=["pre", "post", "eval"])
+    sweep_parser.add_argument("--models", nargs="+", default=["gemma3:27b-it-qat", "deepseek-r1:1.5b"])
+    sweep_parser.add_argument("--prompts", nargs="+", choices=["approach4", "eval"], default=["approach4", "eval"])
+    sweep_parser.add_argument("--contexts", help="materialised contexts (JSONL), default <input>.contexts.jsonl")
+    sweep_parser.add_argument("--skip-retrieval", action="store_true", help="only run the answer stage on existing contexts")
+    sweep_parser.add_argument("--output", default="sweep_results.csv")
+    add_cache_arguments(sweep_parser)
+    add_storage_arguments(sweep_parser)
+    sweep_parser.set_defaults(func=sweep)
+
+    analyze_parser = subparsers.add_parser("analyze", help="recompute metrics from an evaluation CSV")
+    analyze_parser.add_argument("path", nargs="?", default="Eval_MK/evaluation_results.csv")
+    analyze_parser.set_defaults(func=analyze)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
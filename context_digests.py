@@ -0,0 +1,81 @@
+import re
+
+
+#offline enrichment after stix_to_neo.py has loaded the bundles: every node and relationship description
+#gets a compact digest without citation and link markup, so query-time contexts do not paste raw ATT&CK text.
+#A digest records the "modified" it was built from and is only rebuilt when that changes
+DIGEST_PROPERTY = "digest"
+DIGEST_MODIFIED_PROPERTY = "digest_modified"
+NODE_DIGEST_MAX_CHARS = 400
+RELATIONSHIP_DIGEST_MAX_CHARS = 200
+
+CITATION_PATTERN = re.compile(r"\s*\(Citation:[^)]*\)")
+LINK_PATTERN = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+HTML_TAG_PATTERN = re.compile(r"</?[A-Za-z][^>]*>")
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def strip_markup(text):
+    text = CITATION_PATTERN.sub("", text)
+    text = LINK_PATTERN.sub(r"\1", text)
+    text = HTML_TAG_PATTERN.sub("", text)
+    return " ".join(text.split())
+
+
+def digest_text(text, max_chars=NODE_DIGEST_MAX_CHARS):
+    text = strip_markup(text or "")
+    if len(text) <= max_chars:
+        return text
+
+    #whole leading sentences up to max_chars, a single overlong first sentence is cut at a word boundary
+    digest = ""
+    for sentence in SENTENCE_END_PATTERN.split(text):
+        if len(digest) + len(sentence) + 1 > max_chars:
+            break
+        digest = f"{digest} {sentence}" if digest else sentence
+    return digest or text[:max_chars].rsplit(" ", 1)[0] + " ..."
+
+
+def get_stale_query(pattern, variable):
+    return f"""
+        MATCH {pattern}
+        WHERE {variable}.description IS NOT NULL
+          AND ({variable}.{DIGEST_PROPERTY} IS NULL OR {variable}.{DIGEST_MODIFIED_PROPERTY} IS NULL
+               OR {variable}.{DIGEST_MODIFIED_PROPERTY} <> coalesce({variable}.modified, ""))
+        RETURN elementId({variable}) AS element_id, {variable}.description AS description, coalesce({variable}.modified, "") AS modified
+    """
+
+
+def refresh_digests(driver, pattern, variable, max_chars, batch_size=500, neo4j_database=None):
+    records, _, _ = driver.execute_query(get_stale_query(pattern, variable), database_=neo4j_database)
+    rows = [
+        {"id": record["element_id"], "digest": digest_text(record["description"], max_chars), "modified": record["modified"]}
+        for record in records
+    ]
+
+    for start in range(0, len(rows), batch_size):
+        driver.execute_query(
+            f"""
+            UNWIND $rows AS row
+            MATCH {pattern} WHERE elementId({variable}) = row.id
+            SET {variable}.{DIGEST_PROPERTY} = row.digest, {variable}.{DIGEST_MODIFIED_PROPERTY} = row.modified
+            """,
+            rows=rows[start:start + batch_size],
+            database_=neo4j_database,
+        )
+    return len(rows)
+
+
+def refresh_node_digests(driver, batch_size=500, neo4j_database=None):
+    return refresh_digests(driver, "(n)", "n", NODE_DIGEST_MAX_CHARS, batch_size, neo4j_database)
+
+
+def refresh_relationship_digests(driver, batch_size=500, neo4j_database=None):
+    return refresh_digests(driver, "()-[r]->()", "r", RELATIONSHIP_DIGEST_MAX_CHARS, batch_size, neo4j_database)
+
+
+def refresh_all_digests(driver, batch_size=500, neo4j_database=None):
+    return {
+        "nodes": refresh_node_digests(driver, batch_size, neo4j_database),
+        "relationships": refresh_relationship_digests(driver, batch_size, neo4j_database),
+    }
@@ -0,0 +1,154 @@
+import ast
+import json
+import re
+
+from stix_to_neo import to_pascal_case
+from attack_constants import ATTACK_ID_PATTERN
+
+
+#per-domain vector index shards: SDOs get a label per ATT&CK domain (x_mitre_domains), every domain label
+#gets its own vector index, and a router picks the shard(s) for a query from its ATT&CK IDs or keywords.
+#Queries without any domain signal keep using the combined index
+DOMAINS = ("enterprise-attack", "mobile-attack", "ics-attack")
+#a shard with fewer embedded nodes only holds objects shared with the loaded domains (e.g. the 111 enterprise
+#objects of the ICS and mobile bundles) and is not routed to
+MIN_SHARD_NODES = 200
+
+DOMAIN_KEYWORDS = {
+    "ics-attack": re.compile(
+        r"\b(ics|scada|plcs?|hmis?|modbus|dnp3|profinet|iec[ -]?61850|safety instrumented|industrial control"
+        r"|operational technology|engineering workstation|field devices?|rtus?|historian|process control)\b",
+        re.IGNORECASE),
+    "mobile-attack": re.compile(
+        r"\b(android|ios|iphone|ipad|mobile|smartphones?|apks?|play store|app store|imessage|jailbr\w*)\b",
+        re.IGNORECASE),
+    "enterprise-attack": re.compile(
+        r"\b(windows|linux|macos|active directory|registry|powershell|kerberos|ldap|office 365|azure|aws|gcp"
+        r"|saas|iaas|esxi|lsass|wmi|rdp|dlls?)\b",
+        re.IGNORECASE),
+}
+
+
+def get_domain_label(domain):
+    return to_pascal_case(domain)
+
+
+def get_shard_index_name(index_name, domain):
+    return f"{index_name}{get_domain_label(domain)}"
+
+
+def get_node_domains(domains, x_mitre_domains):
+    #native list from stix_records.py, otherwise the serialised x_mitre_domains of stix_to_neo.py or the notebooks
+    if domains:
+        return list(domains)
+    if not x_mitre_domains:
+        return []
+    if isinstance(x_mitre_domains, list):
+        return x_mitre_domains
+    try:
+        return json.loads(x_mitre_domains)
+    except ValueError:
+        try:
+            return ast.literal_eval(x_mitre_domains)
+        except (ValueError, SyntaxError):
+            return []
+
+
+# --- Neo4j ---
+
+def label_domains(driver, label="SDO", domains=DOMAINS, batch_size=1000, neo4j_database=None):
+    #labels are rebuilt from scratch, so objects that left a domain also leave its shard
+    domain_labels = ":".join(get_domain_label(domain) for domain in domains)
+    driver.execute_query(f"MATCH (n:{label}) REMOVE n:{domain_labels}", database_=neo4j_database)
+
+    records, _, _ = driver.execute_query(
+        f"MATCH (n:{label}) RETURN elementId(n) AS element_id, n.domains AS domains, n.x_mitre_domains AS x_mitre_domains",
+        database_=neo4j_database,
+    )
+    by_domain = {domain: [] for domain in domains}
+    for record in records:
+        for domain in get_node_domains(record["domains"], record["x_mitre_domains"]):
+            if domain in by_domain:
+                by_domain[domain].append(record["element_id"])
+
+    for domain, element_ids in by_domain.items():
+        for start in range(0, len(element_ids), batch_size):
+            driver.execute_query(
+                f"UNWIND $ids AS id MATCH (n) WHERE elementId(n) = id SET n:{get_domain_label(domain)}",
+                ids=element_ids[start:start + batch_size],
+                database_=neo4j_database,
+            )
+    return {domain: len(element_ids) for domain, element_ids in by_domain.items()}
+
+
+def create_domain_indexes(driver, index_name, dimensions, domains=DOMAINS, embedding_property="embedding",
+                          neo4j_database=None):
+    from neo4j_graphrag.indexes import create_vector_index
+
+    for domain in domains:
+        create_vector_index(
+            driver,
+            get_shard_index_name(index_name, domain),
+            label=get_domain_label(domain),
+            embedding_property=embedding_property,
+            dimensions=dimensions,
+            similarity_fn="cosine",
+            neo4j_database=neo4j_database,
+        )
+
+
+def get_vector_index_names(driver, neo4j_database=None):
+    records, _, _ = driver.execute_query(
+        'SHOW INDEXES YIELD name, type WHERE type = "VECTOR" RETURN name', database_=neo4j_database
+    )
+    return {record["name"] for record in records}
+
+
+# --- Routing ---
+
+class DomainRouter:
+
+    def __init__(self, index_name, domains=DOMAINS, snapshot=None):
+        self.index_name = index_name
+        self.domains = domains
+        self.snapshot = snapshot
+
+    @classmethod
+    def for_driver(cls, driver, index_name, snapshot=None, min_nodes=MIN_SHARD_NODES, neo4j_database=None):
+        #only domains whose shard index exists and covers enough nodes are routed to, None if there are none
+        existing = get_vector_index_names(driver, neo4j_database)
+        domains = []
+        for domain in DOMAINS:
+            if get_shard_index_name(index_name, domain) not in existing:
+                continue
+            records, _, _ = driver.execute_query(
+                f"MATCH (n:{get_domain_label(domain)}) WHERE n.embedding IS NOT NULL RETURN count(n) AS nodes",
+                database_=neo4j_database,
+            )
+            if records[0]["nodes"] >= min_nodes:
+                domains.append(domain)
+        return cls(index_name, tuple(domains), snapshot) if domains else None
+
+    def route(self, query_text):
+        #ATT&CK IDs resolved through the snapshot are the strongest signal, keywords are the fallback
+        #returns the routed domains and whether they came from IDs
+        routed = set()
+        if self.snapshot is not None:
+            for attack_id in ATTACK_ID_PATTERN.findall(query_text):
+                node = self.snapshot.find_by_attack_id(attack_id)
+                if node and node["domains"]:
+                    routed.update(node["domains"].split(","))
+        by_id = bool(routed)
+
+        if not routed:
+            routed = {domain for domain, pattern in DOMAIN_KEYWORDS.items() if pattern.search(query_text)}
+        return [domain for domain in DOMAINS if domain in routed], by_id
+
+    def index_names(self, query_text):
+        routed, by_id = self.route(query_text)
+        #a routed domain without a shard means the combined index is the only one covering it
+        if not routed or any(domain not in self.domains for domain in routed):
+            return [self.index_name]
+        shards = [get_shard_index_name(self.index_name, domain) for domain in routed]
+        #a single keyword is a weak signal, the combined index is searched as well and the results merged
+        return shards if by_id else shards + [self.index_name]
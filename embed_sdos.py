@@ -0,0 +1,74 @@
+#embedding step of attck2neo.ipynb / M2_vec_sim_neighboring_nodes.ipynb as a script
+#neo4j_graphrag and the embedding model are only imported when the step actually runs
+
+
+def create_indexes(driver, index_name, dimensions, fulltext_index_name="SDOText", neo4j_database=None):
+    from neo4j_graphrag.indexes import create_vector_index
+    from hybrid_retriever import create_fulltext_index
+
+    create_vector_index(
+        driver,
+        index_name,
+        label="SDO",
+        embedding_property="embedding",
+        dimensions=dimensions,
+        similarity_fn="cosine",
+        neo4j_database=neo4j_database,
+    )
+    create_fulltext_index(driver, fulltext_index_name, neo4j_database=neo4j_database)
+
+
+def get_embedding_text(node, relationships=None):
+    if not node.get("description"):
+        return node["name"]
+
+    text = f"{node['name']}\n\n{node['description']}"
+    #M2 approach: relationships of the node are embedded together with its description
+    if relationships:
+        rel_text = ". ".join(
+            [f"Related to {rel['target']} via {rel['type']}" for rel in relationships if rel["target"]]
+        )
+        text = f"{text}. {rel_text}"
+    return text
+
+
+def embed_sdos(driver, embedder, with_relationships=False, neo4j_database=None):
+    from neo4j_graphrag.indexes import upsert_vectors
+    from neo4j_graphrag.types import EntityType
+
+    with driver.session(database=neo4j_database) as session:
+        result = session.run("""
+            MATCH (n:SDO)
+            WHERE n.name IS NOT NULL
+            OPTIONAL MATCH (n)-[r]->(m)
+            RETURN n, collect({type: type(r), target: m.name}) AS relationships
+        """)
+
+        for record in result:
+            node = record["n"]
+            relationships = record["relationships"] if with_relationships else None
+
+            vector = embedder.embed_query(get_embedding_text(node, relationships))
+            upsert_vectors(
+                driver,
+                ids=[node.element_id],
+                embedding_property="embedding",
+                embeddings=[vector],
+                entity_type=EntityType.NODE,
+                neo4j_database=neo4j_database,
+            )
+
+
+#STIX id -> vector of an embedded graph, the input of "cli.py export --embeddings"
+#so a rebuilt database gets its vectors without calling the embedding model again
+def dump_embeddings(driver, path, neo4j_database=None):
+    import json
+
+    records, _, _ = driver.execute_query(
+        "MATCH (n:SDO) WHERE n.embedding IS NOT NULL RETURN n.id AS id, n.embedding AS embedding",
+        database_=neo4j_database,
+    )
+    embeddings = {record["id"]: list(record["embedding"]) for record in records}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(embeddings, f)
+    return len(embeddings)
@@ -0,0 +1,394 @@
+import time
+
+import numpy as np
+
+from attack_constants import REDUCED_PROPERTY, INT8_PROPERTY, INT8_SCALE_PROPERTY, BINARY_PROPERTY, NODE_WITHOUT_EMBEDDINGS
+
+
+#compressed storage for the 3584-dim SDO embeddings, one of:
+#a reduced float vector (PCA or Matryoshka-style truncation) with its own smaller vector index,
+#or int8 / binary codes for an in-process shortlist; the full-precision re-rank over the shortlist reads
+#the vectors kept next to the reduction file
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class Reduction:
+
+    def __init__(self, method, dimensions, mean=None, components=None):
+        self.method = method
+        self.dimensions = dimensions
+        self.mean = mean
+        self.components = components
+
+    @classmethod
+    def fit(cls, vectors, dimensions, method="pca"):
+        if method == "truncate":
+            return cls(method, dimensions)
+
+        vectors = normalize(vectors)
+        mean = vectors.mean(axis=0)
+        #principal components from the SVD of the centred matrix, largest variance first
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        dimensions = min(dimensions, vt.shape[0])
+        return cls(method, dimensions, mean, vt[:dimensions])
+
+    def transform(self, vectors):
+        vectors = normalize(vectors)
+        if self.method == "truncate":
+            return normalize(vectors[..., :self.dimensions])
+        return normalize((vectors - self.mean) @ self.components.T)
+
+    def save(self, path):
+        np.savez(path, method=self.method, dimensions=self.dimensions,
+                 mean=self.mean if self.mean is not None else np.zeros(0),
+                 components=self.components if self.components is not None else np.zeros((0, 0)))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        method = str(data["method"])
+        if method == "truncate":
+            return cls(method, int(data["dimensions"]))
+        return cls(method, int(data["dimensions"]), data["mean"], data["components"])
+
+
+def quantize_int8(vectors):
+    #symmetric per-vector scale, the code times the scale approximates the vector
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.maximum(np.abs(vectors).max(axis=-1, keepdims=True), 1e-12) / 127.0
+    codes = np.clip(np.round(vectors / scales), -127, 127).astype(np.int8)
+    return codes, scales[..., 0]
+
+
+def quantize_binary(vectors):
+    return np.packbits(np.asarray(vectors) > 0, axis=-1)
+
+
+class QuantizedIndex:
+
+    def __init__(self, element_ids, reduction, quantization, codes, scales=None):
+        self.element_ids = element_ids
+        self.reduction = reduction
+        self.quantization = quantization
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def build(cls, element_ids, vectors, reduction, quantization="int8"):
+        reduced = reduction.transform(vectors)
+        if quantization == "int8":
+            codes, scales = quantize_int8(reduced)
+            return cls(element_ids, reduction, quantization, codes, scales)
+        if quantization == "binary":
+            return cls(element_ids, reduction, quantization, quantize_binary(reduced))
+        return cls(element_ids, reduction, "float", reduced)
+
+    def shortlist(self, query_vector, size):
+        query = self.reduction.transform(query_vector)
+        if self.quantization == "int8":
+            #asymmetric scoring: float query against dequantised int8 codes
+            scores = (self.codes.astype(np.float32) @ query) * self.scales
+        elif self.quantization == "binary":
+            query_bits = quantize_binary(query)
+            scores = -np.unpackbits(np.bitwise_xor(self.codes, query_bits), axis=-1).sum(axis=-1)
+        else:
+            scores = self.codes @ query
+
+        size = min(size, len(self.element_ids))
+        top = np.argpartition(-scores, size - 1)[:size]
+        return [self.element_ids[i] for i in top[np.argsort(-scores[top])]]
+
+
+#full-precision vectors for the re-rank, stored next to the reduction instead of on the nodes
+#the .npy file is memory-mapped, so a query only reads the rows of its shortlist
+class FullVectors:
+
+    def __init__(self, element_ids, vectors):
+        self.element_ids = element_ids
+        self.vectors = vectors
+        self.rows = {element_id: i for i, element_id in enumerate(element_ids)}
+
+    def get(self, element_ids):
+        element_ids = [element_id for element_id in element_ids if element_id in self.rows]
+        return element_ids, np.asarray(self.vectors[[self.rows[element_id] for element_id in element_ids]], dtype=np.float32)
+
+    def save(self, path):
+        import json
+
+        np.save(f"{path}.npy", np.asarray(self.vectors, dtype=np.float32))
+        with open(f"{path}.ids.json", "w") as f:
+            json.dump(list(self.element_ids), f)
+
+    @classmethod
+    def load(cls, path):
+        import json
+
+        with open(f"{path}.ids.json") as f:
+            element_ids = json.load(f)
+        return cls(element_ids, np.load(f"{path}.npy", mmap_mode="r"))
+
+
+def get_full_vectors_path(reduction_path):
+    #embedding-reduction.npz -> embedding-reduction-vectors(.npy, .ids.json)
+    return f"{reduction_path.removesuffix('.npz')}-vectors"
+
+
+def rerank(query_vector, element_ids, full_vectors, top_k):
+    scores = normalize(full_vectors) @ normalize(query_vector)
+    order = np.argsort(-scores)[:top_k]
+    return [(element_ids[i], float(scores[i])) for i in order]
+
+
+# --- Neo4j ---
+
+def fetch_embeddings(driver, label="SDO", neo4j_database=None):
+    records, _, _ = driver.execute_query(
+        f"MATCH (n:{label}) WHERE n.embedding IS NOT NULL RETURN elementId(n) AS element_id, n.embedding AS embedding",
+        database_=neo4j_database,
+    )
+    return [record["element_id"] for record in records], np.array([record["embedding"] for record in records], dtype=np.float32)
+
+
+#only the representation of the chosen storage is written ("index": reduced floats with their own vector index,
+#"int8" / "binary": codes for the in-memory shortlist), representations of an earlier run are removed
+def store_compressed_embeddings(driver, element_ids, vectors, reduction, storage="int8", index_name=None,
+                                batch_size=500, neo4j_database=None):
+    reduced = reduction.transform(vectors)
+    if storage == "index":
+        columns = {REDUCED_PROPERTY: [vector.tolist() for vector in reduced]}
+    elif storage == "binary":
+        columns = {BINARY_PROPERTY: [bits.tobytes() for bits in quantize_binary(reduced)]}
+    else:
+        codes, scales = quantize_int8(reduced)
+        columns = {INT8_PROPERTY: [code.tobytes() for code in codes], INT8_SCALE_PROPERTY: [float(scale) for scale in scales]}
+
+    assignments = ", ".join(f"n.{name} = row.{name}" for name in columns)
+    removals = ", ".join(f"n.{name}" for name in (REDUCED_PROPERTY, INT8_PROPERTY, INT8_SCALE_PROPERTY, BINARY_PROPERTY)
+                         if name not in columns)
+    for start in range(0, len(element_ids), batch_size):
+        end = min(start + batch_size, len(element_ids))
+        rows = [{"id": element_ids[i], **{name: values[i] for name, values in columns.items()}} for i in range(start, end)]
+        driver.execute_query(
+            f"""
+            UNWIND $rows AS row
+            MATCH (n) WHERE elementId(n) = row.id
+            SET {assignments}
+            REMOVE {removals}
+            """,
+            rows=rows,
+            database_=neo4j_database,
+        )
+
+    if storage == "index" and index_name:
+        from neo4j_graphrag.indexes import create_vector_index
+
+        create_vector_index(driver, index_name, label="SDO", embedding_property=REDUCED_PROPERTY,
+                            dimensions=reduction.dimensions, similarity_fn="cosine", neo4j_database=neo4j_database)
+
+
+def drop_full_embeddings(driver, index_name, label="SDO", batch_size=1000, neo4j_database=None):
+    #compressed mode re-ranks from FullVectors, so the full-dimension index, its domain shards and the
+    #embedding property can leave the store
+    from domain_shards import DOMAINS, get_shard_index_name
+
+    for name in [index_name] + [get_shard_index_name(index_name, domain) for domain in DOMAINS]:
+        driver.execute_query(f"DROP INDEX {name} IF EXISTS", database_=neo4j_database)
+
+    removed = 0
+    while True:
+        records, _, _ = driver.execute_query(
+            f"""
+            MATCH (n:{label}) WHERE n.embedding IS NOT NULL
+            WITH n LIMIT $batch_size
+            REMOVE n.embedding
+            RETURN count(n) AS removed
+            """,
+            batch_size=batch_size,
+            database_=neo4j_database,
+        )
+        if not records[0]["removed"]:
+            return removed
+        removed += records[0]["removed"]
+
+
+def load_quantized_index(driver, reduction, quantization="int8", label="SDO", neo4j_database=None):
+    code_property = BINARY_PROPERTY if quantization == "binary" else INT8_PROPERTY
+    records, _, _ = driver.execute_query(
+        f"""
+        MATCH (n:{label}) WHERE n.{code_property} IS NOT NULL
+        RETURN elementId(n) AS element_id, n.{INT8_PROPERTY} AS int8, n.{INT8_SCALE_PROPERTY} AS scale, n.{BINARY_PROPERTY} AS binary
+        """,
+        database_=neo4j_database,
+    )
+    element_ids = [record["element_id"] for record in records]
+    if quantization == "binary":
+        codes = np.array([np.frombuffer(record["binary"], dtype=np.uint8) for record in records])
+        return QuantizedIndex(element_ids, reduction, quantization, codes)
+
+    codes = np.array([np.frombuffer(record["int8"], dtype=np.int8) for record in records])
+    scales = np.array([record["scale"] for record in records], dtype=np.float32)
+    return QuantizedIndex(element_ids, reduction, "int8", codes, scales)
+
+
+#shortlist from the compressed codes, or from the vector index on the reduced embeddings if index_name is set,
+#then re-rank the shortlist on its full-precision vectors (FullVectors) and fetch the properties of the top k only
+#returned node properties never include the embedding properties
+class CompressedRetriever:
+
+    def __init__(self, driver, embedder, full_vectors, quantized_index=None, shortlist_size=100, neo4j_database=None,
+                 reduction=None, index_name=None):
+        self.driver = driver
+        self.embedder = embedder
+        self.full_vectors = full_vectors
+        self.quantized_index = quantized_index
+        self.shortlist_size = shortlist_size
+        self.neo4j_database = neo4j_database
+        self.reduction = reduction or quantized_index.reduction
+        self.index_name = index_name
+
+    def shortlist(self, query_vector):
+        if self.index_name is None:
+            return self.quantized_index.shortlist(query_vector, self.shortlist_size)
+
+        records, _, _ = self.driver.execute_query(
+            """
+            CALL db.index.vector.queryNodes($index_name, $size, $query_vector)
+            YIELD node
+            RETURN elementId(node) AS element_id
+            """,
+            index_name=self.index_name,
+            size=self.shortlist_size,
+            query_vector=self.reduction.transform(query_vector).tolist(),
+            database_=self.neo4j_database,
+        )
+        return [record["element_id"] for record in records]
+
+    def search(self, query_text=None, top_k=10, query_vector=None):
+        from neo4j_graphrag.types import RetrieverResult, RetrieverResultItem
+
+        if query_vector is None:
+            query_vector = self.embedder.embed_query(query_text)
+
+        items = [
+            RetrieverResultItem(content=str(properties), metadata={"id": element_id, "nodeLabels": labels, "score": score})
+            for element_id, properties, labels, score in self.search_nodes(query_vector, top_k)
+        ]
+        return RetrieverResult(items=items)
+
+    def search_nodes(self, query_vector, top_k=10):
+        #(element id, properties, labels, score), also the vector path of hybrid_retriever.HybridRetriever
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+
+        element_ids, vectors = self.full_vectors.get(self.shortlist(query_vector))
+        if not element_ids:
+            return []
+        ranked = rerank(query_vector, element_ids, vectors, top_k)
+
+        records, _, _ = self.driver.execute_query(
+            f"""
+            MATCH (n) WHERE elementId(n) IN $ids
+            RETURN elementId(n) AS element_id, labels(n) AS labels, {NODE_WITHOUT_EMBEDDINGS} AS properties
+            """,
+            ids=[element_id for element_id, _ in ranked],
+            database_=self.neo4j_database,
+        )
+        by_id = {record["element_id"]: record for record in records}
+
+        return [
+            (element_id, {k: v for k, v in by_id[element_id]["properties"].items() if v is not None},
+             by_id[element_id]["labels"], score)
+            for element_id, score in ranked if element_id in by_id
+        ]
+
+
+def load_compressed_retriever(driver, embedder, storage, reduction_path, index_name="SDOsReduced",
+                              shortlist_size=100, neo4j_database=None):
+    #storage written by cli.py compress: "int8"/"binary" codes held in memory or the reduced vector "index"
+    reduction = Reduction.load(reduction_path)
+    full_vectors = FullVectors.load(get_full_vectors_path(reduction_path))
+    if storage == "index":
+        return CompressedRetriever(driver, embedder, full_vectors, shortlist_size=shortlist_size,
+                                   neo4j_database=neo4j_database, reduction=reduction, index_name=index_name)
+    quantized_index = load_quantized_index(driver, reduction, storage, neo4j_database=neo4j_database)
+    return CompressedRetriever(driver, embedder, full_vectors, quantized_index, shortlist_size, neo4j_database)
+
+
+# --- Recall vs. latency report ---
+
+def recall_latency_report(element_ids, vectors, query_vectors, dimensions=(3584, 1024, 512, 256, 128),
+                          quantizations=("float", "int8", "binary"), shortlist_sizes=(10, 50, 100), top_k=10,
+                          method="pca"):
+    #ground truth: exact full-precision top-k for every question
+    full = normalize(vectors)
+    queries = normalize(query_vectors)
+    truth = [set(np.argsort(-(full @ query))[:top_k]) for query in queries]
+    index_of = {element_id: i for i, element_id in enumerate(element_ids)}
+
+    start = time.perf_counter()
+    for query in queries:
+        np.argsort(-(full @ query))[:top_k]
+    baseline_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    rows = [{"dimensions": vectors.shape[1], "quantization": "float", "shortlist": "-", "recall": 1.0,
+             "latency_ms": round(baseline_ms, 3), "bytes_per_node": vectors.shape[1] * 4}]
+
+    measured = set()
+    for dimension in dimensions:
+        if dimension > vectors.shape[1]:
+            continue
+        reduction = Reduction.fit(vectors, dimension, method)
+        #PCA keeps at most as many components as there are nodes
+        dimension = reduction.dimensions
+        if dimension in measured:
+            continue
+        measured.add(dimension)
+        for quantization in quantizations:
+            quantized_index = QuantizedIndex.build(element_ids, vectors, reduction, quantization)
+            bytes_per_node = {"float": dimension * 4, "int8": dimension + 4, "binary": (dimension + 7) // 8}[quantization]
+
+            for shortlist_size in shortlist_sizes:
+                if shortlist_size < top_k:
+                    continue
+                hits = 0
+                start = time.perf_counter()
+                for query, expected in zip(query_vectors, truth):
+                    shortlist = quantized_index.shortlist(query, shortlist_size)
+                    positions = [index_of[element_id] for element_id in shortlist]
+                    ranked = rerank(query, positions, vectors[positions], top_k)
+                    hits += len(expected & {position for position, _ in ranked})
+                latency_ms = (time.perf_counter() - start) / len(query_vectors) * 1000
+
+                rows.append({"dimensions": dimension, "quantization": quantization, "shortlist": shortlist_size,
+                             "recall": round(hits / (len(query_vectors) * top_k), 4),
+                             "latency_ms": round(latency_ms, 3), "bytes_per_node": bytes_per_node})
+    return rows
+
+
+def run_report(driver, model, questions_path, top_k=10, method="pca", neo4j_database=None):
+    from pre_embed import PrecomputedEmbeddings, read_questions, embed_texts
+
+    element_ids, vectors = fetch_embeddings(driver, neo4j_database=neo4j_database)
+    questions = [question for question, _ in read_questions(questions_path)]
+
+    #vectors from cli.py pre-embed where available, the rest in batches
+    precomputed = PrecomputedEmbeddings.for_dataset(questions_path, model)
+    stored = [precomputed.get(question) if precomputed else None for question in questions]
+    missing = [question for question, vector in zip(questions, stored) if vector is None]
+    embedded = iter(embed_texts(missing, model) if missing else [])
+    query_vectors = np.array([vector if vector is not None else next(embedded) for vector in stored], dtype=np.float32)
+
+    rows = recall_latency_report(element_ids, vectors, query_vectors, top_k=top_k, method=method)
+    print_report(rows)
+    return rows
+
+
+def print_report(rows):
+    print(f"{'dims':>6}{'quant':>8}{'shortlist':>11}{'recall@k':>10}{'ms/query':>10}{'bytes/node':>12}")
+    for row in rows:
+        print(f"{row['dimensions']:>6}{row['quantization']:>8}{row['shortlist']:>11}{row['recall']:>10}"
+              f"{row['latency_ms']:>10}{row['bytes_per_node']:>12}")
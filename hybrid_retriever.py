@@ -0,0 +1,173 @@
+import re
+
+from attack_constants import ATTACK_ID_PATTERN, NODE_WITHOUT_EMBEDDINGS
+
+
+LUCENE_SPECIAL_CHARACTERS = re.compile(r'([+\-!(){}\[\]^"~*?:\\/]|&&|\|\|)')
+
+
+#hybrid retrieval over the SDO nodes: exact ATT&CK ID lookup, full-text (BM25) search on name/description
+#and vector search, fused by reciprocal rank
+#the exact ID path needs no embedding, so the embedding call is skipped when every ID in the query resolves
+#with a router (domain_shards.DomainRouter) the vector path searches only the per-domain shard(s) of the query,
+#with a compressed retriever (embedding_store.CompressedRetriever) it runs on the compressed embeddings instead
+class HybridRetriever:
+
+    def __init__(self, driver, vector_index_name, fulltext_index_name, embedder, snapshot=None,
+                 neo4j_database=None, rrf_k=60, router=None, compressed=None):
+        self.driver = driver
+        self.vector_index_name = vector_index_name
+        self.fulltext_index_name = fulltext_index_name
+        self.embedder = embedder
+        self.snapshot = snapshot
+        self.neo4j_database = neo4j_database
+        self.rrf_k = rrf_k
+        self.router = router
+        self.compressed = compressed
+        self._nodes = {}
+        self._fulltext_available = None
+
+    def search(self, query_text, top_k=10, query_vector=None):
+        from neo4j_graphrag.types import RetrieverResult, RetrieverResultItem
+
+        self._nodes = {}
+        ranked_lists = {}
+        vector_index_names = []
+        attack_ids = list(dict.fromkeys(ATTACK_ID_PATTERN.findall(query_text)))
+
+        id_hits = self.search_attack_ids(attack_ids) if attack_ids else []
+        if id_hits:
+            ranked_lists["id"] = id_hits
+
+        if self.has_fulltext_index():
+            ranked_lists["fulltext"] = self.search_fulltext(query_text, top_k)
+
+        #one ID can match several nodes, so the vector path is skipped only if every ID itself resolved
+        resolved = {self._nodes[element_id][0].get("attack_id") for element_id in id_hits}
+        if not attack_ids or not resolved.issuperset(attack_ids):
+            if query_vector is None:
+                query_vector = self.embedder.embed_query(query_text)
+            if self.compressed is not None:
+                ranked_lists["vector"] = self.search_compressed(query_vector, top_k)
+            else:
+                vector_index_names = self.router.index_names(query_text) if self.router else [self.vector_index_name]
+                ranked_lists["vector"] = self.search_vector(query_vector, top_k, vector_index_names)
+
+        fused = reciprocal_rank_fusion(ranked_lists, self.rrf_k)
+
+        items = []
+        for element_id, score, sources in fused[:top_k]:
+            node, labels = self._nodes[element_id]
+            properties = {k: v for k, v in node.items() if v is not None}
+            items.append(RetrieverResultItem(
+                content=str(properties),
+                metadata={"id": element_id, "nodeLabels": labels, "score": score, "sources": sources},
+            ))
+
+        return RetrieverResult(items=items, metadata={"sources": sorted(ranked_lists), "vector_indexes": vector_index_names})
+
+    def search_attack_ids(self, attack_ids):
+        if self.snapshot is not None:
+            rows = [{"stix_id": node["id"], "attack_id": attack_id}
+                    for attack_id, node in zip(attack_ids, map(self.snapshot.find_by_attack_id, attack_ids)) if node]
+            query = f"""
+                UNWIND $rows AS row
+                MATCH (n:SDO {{id: row.stix_id}})
+                RETURN {NODE_WITHOUT_EMBEDDINGS} AS n, labels(n) AS labels, elementId(n) AS element_id, row.attack_id AS attack_id
+            """
+            return self._run(query, rows=rows)
+
+        #without a snapshot the IDs are matched on the indexed attack_id property (stix_records.py),
+        #only IDs it does not resolve (graphs loaded by the notebooks) are searched in the serialised external_references
+        query = f"""
+            MATCH (n:SDO) WHERE n.attack_id IN $attack_ids
+            RETURN {NODE_WITHOUT_EMBEDDINGS} AS n, labels(n) AS labels, elementId(n) AS element_id
+        """
+        element_ids = self._run(query, attack_ids=attack_ids)
+        resolved = {self._nodes[element_id][0].get("attack_id") for element_id in element_ids}
+        unresolved = [attack_id for attack_id in attack_ids if attack_id not in resolved]
+        if not unresolved:
+            return element_ids
+
+        query = f"""
+            UNWIND $attack_ids AS attack_id
+            MATCH (n:SDO)
+            WHERE n.external_references CONTAINS ('"external_id": "' + attack_id + '"')
+               OR n.external_references CONTAINS ("'external_id': '" + attack_id + "'")
+            RETURN {NODE_WITHOUT_EMBEDDINGS} AS n, labels(n) AS labels, elementId(n) AS element_id, attack_id
+        """
+        return element_ids + self._run(query, attack_ids=unresolved)
+
+    def has_fulltext_index(self):
+        #graphs built by the notebooks only have the vector index, the full-text path is then skipped
+        if self._fulltext_available is None:
+            records, _, _ = self.driver.execute_query(
+                'SHOW INDEXES YIELD name, type WHERE type = "FULLTEXT" AND name = $name RETURN name',
+                {"name": self.fulltext_index_name}, database_=self.neo4j_database,
+            )
+            self._fulltext_available = bool(records)
+            if not self._fulltext_available:
+                print(f"Full-text index {self.fulltext_index_name} not found, skipping full-text search "
+                      f"(create it with: python cli.py fulltext-index --name {self.fulltext_index_name})")
+        return self._fulltext_available
+
+    def search_fulltext(self, query_text, top_k):
+        query = f"""
+            CALL db.index.fulltext.queryNodes($index_name, $query_text, {{limit: $top_k}})
+            YIELD node AS n, score
+            RETURN {NODE_WITHOUT_EMBEDDINGS} AS n, labels(n) AS labels, elementId(n) AS element_id
+        """
+        escaped_query = LUCENE_SPECIAL_CHARACTERS.sub(r"\\\1", query_text)
+        return self._run(query, index_name=self.fulltext_index_name, query_text=escaped_query, top_k=top_k)
+
+    def search_vector(self, query_vector, top_k, index_names=None):
+        #nodes of several domains are in several shards, they are merged on their best score
+        query = f"""
+            UNWIND $index_names AS index_name
+            CALL db.index.vector.queryNodes(index_name, $top_k, $query_vector)
+            YIELD node AS n, score
+            WITH n, max(score) AS score
+            ORDER BY score DESC
+            LIMIT $top_k
+            RETURN {NODE_WITHOUT_EMBEDDINGS} AS n, labels(n) AS labels, elementId(n) AS element_id
+        """
+        return self._run(query, index_names=index_names or [self.vector_index_name], top_k=top_k,
+                         query_vector=query_vector)
+
+    def search_compressed(self, query_vector, top_k):
+        element_ids = []
+        for element_id, properties, labels, _ in self.compressed.search_nodes(query_vector, top_k):
+            self._nodes[element_id] = (properties, labels)
+            element_ids.append(element_id)
+        return element_ids
+
+    def _run(self, query, **parameters):
+        element_ids = []
+        records, _, _ = self.driver.execute_query(query, parameters, database_=self.neo4j_database)
+        for record in records:
+            properties = dict(record["n"])
+            #the ID lookups return the ATT&CK ID they matched, graphs loaded by the notebooks have no attack_id property
+            if "attack_id" in record.keys():
+                properties["attack_id"] = properties.get("attack_id") or record["attack_id"]
+            self._nodes[record["element_id"]] = (properties, record["labels"])
+            element_ids.append(record["element_id"])
+        return element_ids
+
+
+def reciprocal_rank_fusion(ranked_lists, k=60):
+    scores = {}
+    sources = {}
+    for source, element_ids in ranked_lists.items():
+        for rank, element_id in enumerate(element_ids):
+            scores[element_id] = scores.get(element_id, 0.0) + 1.0 / (k + rank + 1)
+            sources.setdefault(element_id, []).append(source)
+
+    return sorted(((element_id, score, sources[element_id]) for element_id, score in scores.items()),
+                  key=lambda entry: entry[1], reverse=True)
+
+
+def create_fulltext_index(driver, name="SDOText", label="SDO", neo4j_database=None):
+    driver.execute_query(
+        f"CREATE FULLTEXT INDEX {name} IF NOT EXISTS FOR (n:{label}) ON EACH [n.name, n.description]",
+        database_=neo4j_database,
+    )
@@ -0,0 +1,134 @@
+import csv
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+
+#pre-embedding stage: every query text the runners will embed is known before the run,
+#so all variants are embedded upfront in large batches and stored next to the dataset
+BATCH_SIZE = 64
+
+
+# --- query variants, shared with the runners so the texts match exactly ---
+
+#approach4/post.py, the M2 notebook
+def question_query(question):
+    return question
+
+
+#approach4/pre.py
+def choices_query(question, a, b, c, d):
+    return f"""{question}? {a}, {b}, {c} or {d}?"""
+
+
+#Eval_MK/5_eval.py
+def eval_query(question, choices):
+    full_query = f"{question}\n"
+    for letter, choice_text in choices.items():
+        full_query += f"{letter}) {choice_text}\n"
+    full_query += "Bitte gib deine finale Antwort im Format 'Final Answer: <BUCHSTABE>' an."
+    return full_query
+
+
+VARIANTS = ("question", "choices", "eval")
+#each runner looks its variant up under its own EMBEDDING_MODEL, so a run only needs the variants read with that model
+MODEL_VARIANTS = {
+    "rjmalagon/gte-qwen2-7b-instruct:f16": ("question", "choices"),
+    "nomic-embed-text": ("eval",),
+}
+
+
+def get_query_variants(question, choices, variants=VARIANTS):
+    a, b, c, d = (choices.get(letter, "") for letter in "ABCD")
+    texts = {"question": question_query(question), "choices": choices_query(question, a, b, c, d),
+             "eval": eval_query(question, choices)}
+    return [texts[variant] for variant in variants]
+
+
+# --- datasets ---
+
+def read_questions(path):
+    #AttackSeq CSV exports (AttackSeq-*.csv) or AttackSeqBench JSON tasks
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            return [(item["question"], item["choices"]) for item in json.load(f)]
+
+    with open(path, mode="r", newline="", encoding="utf-8") as infile:
+        return [(row["Question"], {letter: row.get(letter, "") for letter in "ABCD"}) for row in csv.DictReader(infile)]
+
+
+def get_embeddings_path(dataset_path, model):
+    return f"{dataset_path}.{re.sub(r'[^A-Za-z0-9.]+', '-', model)}.npz"
+
+
+def text_key(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# --- embedding ---
+
+def embed_texts(texts, model, batch_size=BATCH_SIZE, host=None):
+    from ollama import Client
+
+    client = Client(host=host)
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        response = client.embed(model=model, input=texts[start:start + batch_size])
+        vectors.extend(response["embeddings"])
+        print(f"Embedded {min(start + batch_size, len(texts))}/{len(texts)} texts")
+    return np.array(vectors, dtype=np.float32)
+
+
+def pre_embed_dataset(dataset_path, model, batch_size=BATCH_SIZE, host=None, variants=None):
+    variants = variants or MODEL_VARIANTS.get(model, VARIANTS)
+    texts = []
+    for question, choices in read_questions(dataset_path):
+        texts.extend(get_query_variants(question, choices, variants))
+    texts = list(dict.fromkeys(texts))
+
+    #vectors of an earlier run with the same model are kept, only new texts are embedded
+    out_path = get_embeddings_path(dataset_path, model)
+    keys = [text_key(text) for text in texts]
+    existing = PrecomputedEmbeddings.load(out_path) if os.path.exists(out_path) else None
+    if existing is not None:
+        missing = [text for text, key in zip(texts, keys) if key not in existing.rows]
+        keys = list(existing.rows) + [text_key(text) for text in missing]
+        vectors = existing.vectors
+        if missing:
+            vectors = np.concatenate([vectors, embed_texts(missing, model, batch_size, host)])
+    else:
+        vectors = embed_texts(texts, model, batch_size, host)
+
+    np.savez(out_path, model=model, keys=np.array(keys), vectors=vectors)
+    return out_path
+
+
+class PrecomputedEmbeddings:
+
+    def __init__(self, model, keys, vectors):
+        self.model = model
+        self.rows = {key: i for i, key in enumerate(keys)}
+        self.vectors = vectors
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(str(data["model"]), [str(key) for key in data["keys"]], data["vectors"])
+
+    @classmethod
+    def for_dataset(cls, dataset_path, model):
+        path = get_embeddings_path(dataset_path, model)
+        return cls.load(path) if os.path.exists(path) else None
+
+    def get(self, text):
+        row = self.rows.get(text_key(text))
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.vectors[row].tolist()
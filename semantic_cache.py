@@ -0,0 +1,62 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from embedding_store import normalize
+
+
+#semantic cache in front of retrieval: paraphrased questions around the same report and technique
+#reuse the context retrieved for an earlier question if their embeddings are within the cosine threshold
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class SemanticCache:
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, max_entries=DEFAULT_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        #key -> (unit vector, value), least recently used first
+        self.entries = OrderedDict()
+        self.next_key = 0
+        self.hits = 0
+        self.misses = 0
+        #stacked vectors of all entries, rebuilt after the first lookup following a store
+        self._matrix = None
+
+    def _nearest(self, vector):
+        if not self.entries:
+            return None, 0.0
+        if self._matrix is None:
+            keys = list(self.entries)
+            self._matrix = (keys, np.stack([self.entries[key][0] for key in keys]))
+
+        keys, matrix = self._matrix
+        scores = matrix @ normalize(vector)
+        best = int(np.argmax(scores))
+        return keys[best], float(scores[best])
+
+    def lookup(self, vector):
+        key, score = self._nearest(vector)
+        if key is None or score < self.threshold:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return self.entries[key][1]
+
+    def store(self, vector, value):
+        self.entries[self.next_key] = (normalize(vector), value)
+        self.next_key += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self._matrix = None
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "hit_rate": round(self.hit_rate, 4)}
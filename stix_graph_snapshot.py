@@ -0,0 +1,290 @@
+import json
+import mmap
+from array import array
+from bisect import bisect_left
+
+from context_digests import digest_text, RELATIONSHIP_DIGEST_MAX_CHARS
+from stix_records import get_attack_id
+from stix_to_neo import to_pascal_case
+
+
+SNAPSHOT_MAGIC = b"STIXSNP2"
+#digest is the citation-free description of context_digests.py, used for query-time contexts
+STRING_COLUMNS = ("type", "name", "attack_id", "domains", "description", "digest")
+
+
+#builds a compact in-memory graph from the same STIX bundles the loader reads
+#nodes are interned into a sorted ID table, edges are stored as CSR arrays per relationship type
+def build_snapshot(paths):
+    objects = {}
+    relationships = {}
+    embedded_relationships = []
+
+    for path in paths:
+        with open(path) as f:
+            stix_json_data = json.load(f)
+
+        for obj in stix_json_data["objects"]:
+            if obj["type"] == "relationship":
+                relationships[obj["id"]] = (obj["source_ref"], to_pascal_case(obj["relationship_type"]), obj["target_ref"],
+                                            digest_text(obj.get("description", ""), RELATIONSHIP_DIGEST_MAX_CHARS))
+            elif obj["type"] != "x-mitre-collection":
+                #the same object can appear in several domain bundles, keep the newest version
+                known = objects.get(obj["id"])
+                if known is None or obj.get("modified", "") >= known.get("modified", ""):
+                    objects[obj["id"]] = obj
+
+        #tactic shortnames are only unique within one domain, so embedded relationships are resolved per bundle
+        embedded_relationships += [(source_ref, relationship_name, target_ref, "")
+                                   for source_ref, relationship_name, target_ref in get_embedded_relationships(stix_json_data["objects"])]
+
+    ids = sorted(objects)
+    index = {stix_id: i for i, stix_id in enumerate(ids)}
+
+    columns = {name: [] for name in STRING_COLUMNS}
+    for stix_id in ids:
+        obj = objects[stix_id]
+        columns["type"].append(obj["type"])
+        columns["name"].append(obj.get("name", ""))
+        columns["attack_id"].append(get_attack_id(obj) or "")
+        columns["domains"].append(",".join(obj.get("x_mitre_domains", [])))
+        columns["description"].append(obj.get("description", ""))
+        columns["digest"].append(digest_text(obj.get("description", "")))
+
+    edges = {}
+    for source_ref, relationship_name, target_ref, digest in list(relationships.values()) + embedded_relationships:
+        if source_ref in index and target_ref in index:
+            edges.setdefault(relationship_name, []).append((index[source_ref], index[target_ref], digest))
+
+    return GraphSnapshot.from_bytes(serialize_snapshot(ids, columns, edges))
+
+
+#same derived edges as load_embedded_relationships in stix_to_neo.py, as (source, type, target) triples
+def get_embedded_relationships(stix_objects):
+    embedded_relationships = []
+
+    ###Matrices to Tactics###
+    for matrix_obj in stix_objects:
+        if matrix_obj["type"] == "x-mitre-matrix":
+            for tactic_ref_id in matrix_obj.get("tactic_refs", []):
+                embedded_relationships.append((matrix_obj["id"], "ReferencesTactic", tactic_ref_id))
+
+    ###Tactics to Techniques###
+    tactic_shortname_to_id = {}
+    for obj in stix_objects:
+        if obj["type"] == "x-mitre-tactic" and "x_mitre_shortname" in obj:
+            tactic_shortname_to_id[obj["x_mitre_shortname"]] = obj["id"]
+
+    for attack_pattern in stix_objects:
+        if attack_pattern["type"] == "attack-pattern":
+            for phase in attack_pattern.get("kill_chain_phases", []):
+                tactic_id = tactic_shortname_to_id.get(phase["phase_name"])
+                if tactic_id:
+                    embedded_relationships.append((tactic_id, "ContainsTechnique", attack_pattern["id"]))
+
+    return embedded_relationships
+
+
+def save_snapshot(paths, out_path):
+    snapshot = build_snapshot(paths)
+    with open(out_path, "wb") as f:
+        f.write(snapshot.buffer)
+    return snapshot
+
+
+def load_snapshot(path):
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return GraphSnapshot.from_bytes(buffer)
+
+
+def serialize_snapshot(ids, columns, edges):
+    sections = {}
+    node_count = len(ids)
+
+    def add_string_table(name, values):
+        offsets = array("I", [0])
+        blob = bytearray()
+        for value in values:
+            blob += value.encode("utf-8")
+            offsets.append(len(blob))
+        sections[f"{name}.offsets"] = offsets
+        sections[f"{name}.blob"] = array("B", blob)
+
+    add_string_table("id", ids)
+    for name in STRING_COLUMNS:
+        add_string_table(name, columns[name])
+
+    attack_id_column = columns["attack_id"]
+    sections["attack_id.order"] = array("I", sorted(
+        (i for i in range(node_count) if attack_id_column[i]), key=lambda i: attack_id_column[i]
+    ))
+
+    for relationship_name, pairs in edges.items():
+        #edge digests in the order of pairs, the {direction}_edge arrays map each CSR slot to its pair
+        add_string_table(f"{relationship_name}.digest", [pair[2] for pair in pairs])
+        for direction, key, value in (("out", 0, 1), ("in", 1, 0)):
+            counts = [0] * (node_count + 1)
+            for pair in pairs:
+                counts[pair[key] + 1] += 1
+            for i in range(node_count):
+                counts[i + 1] += counts[i]
+
+            pointers = array("I", counts)
+            targets = array("I", bytes(4 * len(pairs)))
+            edge_rows = array("I", bytes(4 * len(pairs)))
+            fill = list(counts)
+            for row, pair in enumerate(pairs):
+                targets[fill[pair[key]]] = pair[value]
+                edge_rows[fill[pair[key]]] = row
+                fill[pair[key]] += 1
+
+            sections[f"{relationship_name}.{direction}_ptr"] = pointers
+            sections[f"{relationship_name}.{direction}_idx"] = targets
+            sections[f"{relationship_name}.{direction}_edge"] = edge_rows
+
+    table = {}
+    payload = bytearray()
+    for name, values in sections.items():
+        payload += bytes(-len(payload) % 8)
+        data = values.tobytes()
+        table[name] = [len(payload), len(data), values.typecode]
+        payload += data
+
+    header = json.dumps({
+        "node_count": node_count,
+        "relationship_types": sorted(edges),
+        "itemsize": array("I").itemsize,
+        "sections": table,
+    }).encode("utf-8")
+    header += b" " * (-len(header) % 8)
+
+    return SNAPSHOT_MAGIC + len(header).to_bytes(8, "little") + header + payload
+
+
+class GraphSnapshot:
+
+    def __init__(self, header, buffer, data_start):
+        self.buffer = buffer
+        self.node_count = header["node_count"]
+        self.relationship_types = header["relationship_types"]
+
+        view = memoryview(buffer)
+        self._sections = {}
+        for name, (offset, length, typecode) in header["sections"].items():
+            section = view[data_start + offset:data_start + offset + length]
+            self._sections[name] = section.cast(typecode) if typecode != "B" else section
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        if bytes(buffer[:8]) != SNAPSHOT_MAGIC:
+            raise ValueError("Not a STIX graph snapshot file of this version, rebuild it with: python cli.py snapshot")
+        header_length = int.from_bytes(buffer[8:16], "little")
+        header = json.loads(bytes(buffer[16:16 + header_length]))
+        if header["itemsize"] != array("I").itemsize:
+            raise ValueError("Snapshot was written on a platform with a different integer size.")
+        return cls(header, buffer, 16 + header_length)
+
+    def _string(self, column, i):
+        offsets = self._sections[f"{column}.offsets"]
+        return bytes(self._sections[f"{column}.blob"][offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def index_of(self, stix_id):
+        #binary search over the sorted ID table, no dict has to be built when loading
+        lo, hi = 0, self.node_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._string("id", mid) < stix_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.node_count and self._string("id", lo) == stix_id:
+            return lo
+        return None
+
+    def find_by_attack_id(self, attack_id):
+        order = self._sections["attack_id.order"]
+        lo = bisect_left(range(len(order)), attack_id, key=lambda i: self._string("attack_id", order[i]))
+        if lo < len(order) and self._string("attack_id", order[lo]) == attack_id:
+            return self.node(order[lo])
+        return None
+
+    def node(self, i):
+        properties = {"id": self._string("id", i)}
+        for column in STRING_COLUMNS:
+            properties[column] = self._string(column, i)
+        return properties
+
+    def _adjacent(self, i, relationship_name, direction):
+        pointers = self._sections.get(f"{relationship_name}.{direction}_ptr")
+        if pointers is None:
+            return []
+        return self._sections[f"{relationship_name}.{direction}_idx"][pointers[i]:pointers[i + 1]].tolist()
+
+    def _adjacent_digests(self, i, relationship_name, direction):
+        pointers = self._sections.get(f"{relationship_name}.{direction}_ptr")
+        if pointers is None:
+            return []
+        rows = self._sections[f"{relationship_name}.{direction}_edge"][pointers[i]:pointers[i + 1]].tolist()
+        return [self._string(f"{relationship_name}.digest", row) for row in rows]
+
+    def neighbors(self, stix_id, relationship_types=None, direction="both"):
+        i = self.index_of(stix_id)
+        if i is None:
+            return []
+
+        directions = ("out", "in") if direction == "both" else (direction,)
+        result = []
+        for relationship_name in relationship_types or self.relationship_types:
+            for current_direction in directions:
+                for j in self._adjacent(i, relationship_name, current_direction):
+                    result.append((self.node(j), relationship_name))
+        return result
+
+    #same (neighbour, relationship type, relationship digest) triples as get_neighborhood in Eval_MK/5_eval.py,
+    #without a database round trip
+    def get_neighborhood(self, stix_id):
+        i = self.index_of(stix_id)
+        if i is None:
+            return []
+
+        seen = set()
+        result = []
+        for relationship_name in self.relationship_types:
+            for direction in ("out", "in"):
+                adjacent = self._adjacent(i, relationship_name, direction)
+                digests = self._adjacent_digests(i, relationship_name, direction)
+                for j, digest in zip(adjacent, digests):
+                    neighbor = self.node(j)
+                    if (neighbor["id"], relationship_name) not in seen:
+                        seen.add((neighbor["id"], relationship_name))
+                        result.append((neighbor, relationship_name, digest or None))
+        return result
+
+    def subtechniques(self, technique_id):
+        return [node for node, _ in self.neighbors(technique_id, ["SubtechniqueOf"], "in")]
+
+    def parent_technique(self, technique_id):
+        parents = [node for node, _ in self.neighbors(technique_id, ["SubtechniqueOf"], "out")]
+        return parents[0] if parents else None
+
+    def tactics(self, technique_id):
+        return [node for node, _ in self.neighbors(technique_id, ["ContainsTechnique"], "in")]
+
+    def techniques(self, tactic_id):
+        return [node for node, _ in self.neighbors(tactic_id, ["ContainsTechnique"], "out")]
+
+    def mitigations(self, technique_id):
+        return [node for node, _ in self.neighbors(technique_id, ["Mitigates"], "in")
+                if node["type"] == "course-of-action"]
+
+
+if __name__ == "__main__":
+    save_snapshot(
+        [
+            "attack-stix-data/ics-attack-17.1.json",
+            "attack-stix-data/mobile-attack-17.1.json",
+            #"attack-stix-data/enterprise-attack-17.1.json",
+        ],
+        "attack-graph.snapshot",
+    )
@@ -0,0 +1,112 @@
+import json
+import sys
+
+from stix_to_neo import to_pascal_case
+
+
+#compact record layer for the loader
+#property names are kept as one interned key tuple per distinct object shape instead of a dict per object,
+#type, label and relationship names are interned, and nested values (external_references, kill_chain_phases, ...)
+#are serialised to JSON once while reading, the parsed lists and dicts are not kept
+
+_key_tuples = {}
+_labels = {}
+
+
+def intern_keys(keys):
+    keys = tuple(keys)
+    interned = _key_tuples.get(keys)
+    if interned is None:
+        interned = _key_tuples[keys] = tuple(sys.intern(key) for key in keys)
+    return interned
+
+
+def get_attack_id(stix_object):
+    for reference in stix_object.get("external_references", []):
+        if reference.get("source_name") in ("mitre-attack", "mitre-mobile-attack", "mitre-ics-attack") and "external_id" in reference:
+            return reference["external_id"]
+    return None
+
+
+def get_label(stix_type):
+    label = _labels.get(stix_type)
+    if label is None:
+        label = _labels[stix_type] = sys.intern(to_pascal_case(stix_type))
+    return label
+
+
+class StixRecord:
+    __slots__ = ("id", "type", "label", "keys", "nested", "values", "attack_id", "platforms", "tactics", "domains")
+
+    def __init__(self, stix_object):
+        self.id = stix_object["id"]
+        self.type = sys.intern(stix_object["type"])
+        #relationships are labelled with their relationship type, all other objects with their object type
+        self.label = get_label(stix_object.get("relationship_type", self.type))
+        self.keys = intern_keys(stix_object)
+        #nested values are stored in their Neo4j form (same as get_stix_properties_dict), their keys are kept to decode them
+        values = []
+        nested = []
+        for key, value in stix_object.items():
+            if isinstance(value, (dict, list)):
+                nested.append(key)
+                value = json.dumps(value)
+            values.append(value)
+        self.nested = intern_keys(nested)
+        self.values = tuple(values)
+
+        #commonly queried nested values promoted to native properties
+        self.attack_id = get_attack_id(stix_object)
+        self.platforms = stix_object.get("x_mitre_platforms")
+        self.tactics = [phase["phase_name"] for phase in stix_object.get("kill_chain_phases", [])] or None
+        self.domains = stix_object.get("x_mitre_domains")
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except ValueError:
+            return default
+
+    def __getitem__(self, key):
+        #nested values are decoded on access, only the embedded relationships of matrices and techniques need them
+        value = self.values[self.keys.index(key)]
+        return json.loads(value) if key in self.nested else value
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys}
+
+    #same property layout as get_stix_properties_dict, plus the promoted native properties
+    def neo4j_properties(self):
+        properties = dict(zip(self.keys, self.values))
+
+        if self.attack_id:
+            properties["attack_id"] = self.attack_id
+        if self.platforms:
+            properties["platforms"] = self.platforms
+        if self.tactics:
+            properties["tactic_shortnames"] = self.tactics
+        if self.domains:
+            properties["domains"] = self.domains
+        return properties
+
+
+def read_records(path):
+    with open(path) as f:
+        stix_objects = json.load(f)["objects"]
+
+    #each parsed object is released as soon as its record exists, so the bundle is not held twice
+    stix_objects.reverse()
+    records = []
+    while stix_objects:
+        records.append(StixRecord(stix_objects.pop()))
+    return records
+
+
+#indexes for the id MERGE/MATCH lookups of the loader and the promoted properties,
+#the SDO indexes serve the relationship lookups and the ID path of hybrid_retriever.py
+def create_record_indexes(session, labels):
+    for label in sorted(set(labels) | {"SDO"}):
+        session.run(f"CREATE INDEX {label}_id IF NOT EXISTS FOR (n:{label}) ON (n.id)")
+        session.run(f"CREATE INDEX {label}_attack_id IF NOT EXISTS FOR (n:{label}) ON (n.attack_id)")
+    session.run("CREATE INDEX SDO_platforms IF NOT EXISTS FOR (n:SDO) ON (n.platforms)")
+    session.run("CREATE INDEX SDO_tactic_shortnames IF NOT EXISTS FOR (n:SDO) ON (n.tactic_shortnames)")
@@ -1,122 +1,128 @@
 import json
 from os import getenv
 
-from stix2validator import validate_file, print_results
-from dotenv import load_dotenv
-from neo4j import GraphDatabase
 
+_driver = None
 
-load_dotenv(".env")
-db_uri = getenv("db_uri")
-db_name = getenv("db_name")
-db_username = getenv("db_username")
-db_password= getenv("db_password")
-auth = (db_username, db_password)
-driver = GraphDatabase.driver(uri=db_uri, auth=auth)
 
+#the driver is only created on first use, so importing this module needs neither neo4j nor a running database
+def get_driver():
+    global _driver
+    if _driver is None:
+        from dotenv import load_dotenv
+        from neo4j import GraphDatabase
 
-#main function to load SDOs
-def load_sdos(path):
-    with open(path) as f:
-        stix_json_data = json.load(f)
+        load_dotenv(".env")
+        auth = (getenv("db_username"), getenv("db_password"))
+        _driver = GraphDatabase.driver(uri=getenv("db_uri"), auth=auth)
+    return _driver
 
-    stix_objects = [obj for obj in stix_json_data["objects"] if obj["type"] not in ("relationship", "x-mitre-collection")]
 
-    for stix_object in stix_objects:
+def get_db_name():
+    from dotenv import load_dotenv
+
+    load_dotenv(".env")
+    return getenv("db_name")
+
+
+def close_driver():
+    global _driver
+    if _driver is not None:
+        _driver.close()
+        _driver = None
+
+
+#main function to load SDOs
+#records are StixRecords from stix_records.read_records, nested values are already serialised there
+def load_sdos(session, records):
+    stix_objects = [rec for rec in records if rec.type not in ("relationship", "x-mitre-collection")]
 
-        label = to_pascal_case(stix_object["type"])
-        object_properties = get_stix_properties_dict(stix_object)
+    for stix_object in stix_objects:
 
+        #SDO is the common label the embedding, retrieval and sharding steps match on, as in the notebooks
+        #digests (context_digests.py) survive the reload, they are only rebuilt if "modified" changed
         query = f"""
-            MERGE (x:{label} {{id: "{stix_object["id"]}"}})
-            SET x = $properties
+            MERGE (x:SDO:{stix_object.label} {{id: "{stix_object.id}"}})
+            WITH x, x.digest AS digest, x.digest_modified AS digest_modified
+            SET x = $properties, x.digest = digest, x.digest_modified = digest_modified
         """
 
-        session.run(query, properties=object_properties)
+        session.run(query, properties=stix_object.neo4j_properties())
 
 
 #main function to load SROs
-def load_sros(path):
-    with open(path) as f:
-        stix_json_data = json.load(f)
-
-    stix_relationships = [rel for rel in stix_json_data["objects"] if rel["type"] in "relationship"]
+def load_sros(session, records):
+    stix_relationships = [rel for rel in records if rel.type == "relationship"]
 
     for stix_relationship in stix_relationships:
 
-        relationship_name = to_pascal_case(stix_relationship["relationship_type"])
-        relationship_properties = get_stix_properties_dict(stix_relationship)
+        relationship_name = stix_relationship.label
+        relationship_properties = stix_relationship.neo4j_properties()
 
         query = f"""
-            MATCH (sourceObject {{id: "{stix_relationship["source_ref"]}"}}), (targetObject {{id: "{stix_relationship["target_ref"]}"}})
+            MATCH (sourceObject:SDO {{id: "{stix_relationship["source_ref"]}"}}), (targetObject:SDO {{id: "{stix_relationship["target_ref"]}"}})
             MERGE (sourceObject)-[r:{relationship_name}]->(targetObject)
-            SET r = $properties
+            WITH r, r.digest AS digest, r.digest_modified AS digest_modified
+            SET r = $properties, r.digest = digest, r.digest_modified = digest_modified
         """
         session.run(query, properties=relationship_properties)
 
 
 #main function to load embedded relationships
-def load_embedded_relationships(path):
-    with open(path) as f:
-        stix_json_data = json.load(f)
+def load_embedded_relationships(session, records):
+    for relationship_properties in get_embedded_relationship_properties(records):
+
+        query = f"""
+            MATCH (sourceObject:SDO {{id: "{relationship_properties["source_ref"]}"}}), (targetObject:SDO {{id: "{relationship_properties["target_ref"]}"}})
+            MERGE (sourceObject)-[r:{relationship_properties["relationship_type"]}]->(targetObject)
+            SET r = $properties
+        """
+        session.run(query, properties=relationship_properties)
+
+
+#derives the relationships that are only embedded in object properties, shared by the loader and the export
+def get_embedded_relationship_properties(records):
+    embedded_relationships = []
 
     ###Matrices to Tactics###
 
-    matrix_objects = [obj for obj in stix_json_data["objects"] if obj["type"] == "x-mitre-matrix"]
+    matrix_objects = [obj for obj in records if obj.type == "x-mitre-matrix"]
 
     for matrix_obj in matrix_objects:
 
         for tactic_ref_id in matrix_obj["tactic_refs"]:
 
-            relationship_type = "ReferencesTactic"
-
-            relationship_properties = {
-                "relationship_type": relationship_type,
-                "source_ref": matrix_obj["id"],
+            embedded_relationships.append({
+                "relationship_type": "ReferencesTactic",
+                "source_ref": matrix_obj.id,
                 "target_ref": tactic_ref_id
-            }
-
-            query = f"""
-                MATCH (sourceObject {{id: "{matrix_obj["id"]}"}}), (targetObject {{id: "{tactic_ref_id}"}})
-                MERGE (sourceObject)-[r:{relationship_type}]->(targetObject)
-                SET r = $properties
-            """
-            session.run(query, properties=relationship_properties)
+            })
 
     ###Tactics to Techniques###
 
     tactic_shortname_to_id = {}
-    for obj in stix_json_data["objects"]:
-        if obj["type"] == "x-mitre-tactic" and "x_mitre_shortname" in obj:
-            tactic_shortname_to_id[obj["x_mitre_shortname"]] = obj["id"]
+    for obj in records:
+        if obj.type == "x-mitre-tactic" and obj.get("x_mitre_shortname"):
+            tactic_shortname_to_id[obj["x_mitre_shortname"]] = obj.id
 
-    attack_patterns = [obj for obj in stix_json_data["objects"] if obj["type"] == "attack-pattern"]
+    attack_patterns = [obj for obj in records if obj.type == "attack-pattern"]
 
     for attack_pattern in attack_patterns:
-        attack_pattern_id = attack_pattern["id"]
+        attack_pattern_id = attack_pattern.id
 
         if attack_pattern.get("kill_chain_phases"):
             for phase in attack_pattern["kill_chain_phases"]:
                 phase_name = phase["phase_name"]
 
                 if phase_name in tactic_shortname_to_id:
-                    tactic_id = tactic_shortname_to_id[phase_name]
-
-                    relationship_type = "ContainsTechnique"
-
-                    relationship_properties = {
-                        "relationship_type": relationship_type,
-                        "source_ref": tactic_id,
+                    embedded_relationships.append({
+                        "relationship_type": "ContainsTechnique",
+                        "source_ref": tactic_shortname_to_id[phase_name],
                         "target_ref": attack_pattern_id,
                         "kill_chain_name": phase.get("kill_chain_name")
-                    }
+                    })
 
-                    query = f"""
-                            MATCH (sourceObject {{id: "{tactic_id}"}}), (targetObject {{id: "{attack_pattern_id}"}})
-                            MERGE (sourceObject)-[r:{relationship_type}]->(targetObject)
-                            SET r = $properties
-                        """
-                    session.run(query, properties=relationship_properties)
+    return embedded_relationships
 
 
 def to_pascal_case(input_string):
@@ -136,31 +142,151 @@ def get_stix_properties_dict(stix_dict):
 
     return properties
 
-with (driver.session(database=db_name) as session):
-
-    def load_ics(path: str):
-        results = validate_file(path)
-        print_results(results)
-        #load_sdos(path)
-        #load_sros(path)
-        #load_embedded_relationships(path)
-
-    def load_mobile(path: str):
-        results = validate_file(path)
-        print_results(results)
-        #load_sdos(path)
-        #load_sros(path)
-        #load_embedded_relationships(path)
-
-    def load_enterprise(path: str):
-        results = validate_file(path)
-        print_results(results)
-        #load_sdos(path)
-        #load_sros(path)
-        #load_embedded_relationships(path)
-
-    load_ics("attack-stix-data/ics-attack-17.1.json")
-    #load_mobile("attack-stix-data/mobile-attack-17.1.json")
-    #load_enterprise("attack-stix-data/enterprise-attack-17.1.json")
-
-driver.close()
\ No newline at end of file
+#offline export in the `neo4j-admin database import` format, as an alternative to the online loader for fresh builds
+#writes one header file and one data file per node label and per relationship type into out_dir
+ARRAY_DELIMITER = ";"
+
+
+def export_admin_import(paths, out_dir, embeddings=None, database="neo4j"):
+    import os
+    from stix_records import read_records
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    nodes = {}
+    relationships = {}
+    for path in paths:
+        records = read_records(path)
+        for rec in records:
+            if rec.type == "relationship":
+                relationships[rec.id] = rec
+            elif rec.type != "x-mitre-collection":
+                #the same object can appear in several domain bundles, keep the newest version
+                known = nodes.get(rec.id)
+                if known is None or rec.get("modified", "") >= known.get("modified", ""):
+                    nodes[rec.id] = rec
+
+        for relationship_properties in get_embedded_relationship_properties(records):
+            key = (relationship_properties["source_ref"], relationship_properties["relationship_type"], relationship_properties["target_ref"])
+            relationships[key] = relationship_properties
+
+    node_groups = {}
+    for rec in nodes.values():
+        node_groups.setdefault(rec.label, []).append(rec)
+
+    relationship_groups = {}
+    for rel in relationships.values():
+        #like the MATCH of the online loader, relationships to unknown objects are skipped
+        if rel["source_ref"] in nodes and rel["target_ref"] in nodes:
+            relationship_type = rel["relationship_type"] if isinstance(rel, dict) else rel.label
+            relationship_groups.setdefault(relationship_type, []).append(rel)
+
+    command = [f"neo4j-admin database import full {database}", "--overwrite-destination",
+               "--multiline-fields=true", f'--array-delimiter="{ARRAY_DELIMITER}"']
+
+    for label, group in sorted(node_groups.items()):
+        rows = []
+        for rec in group:
+            properties = rec.neo4j_properties()
+            del properties["id"]
+            if embeddings and rec.id in embeddings:
+                properties["embedding"] = embeddings[rec.id]
+            #SDO like the online loader, embedding, retrieval and sharding match on it
+            rows.append(([rec.id, f"SDO{ARRAY_DELIMITER}{label}"], properties))
+
+        files = write_import_files(out_dir, f"nodes_{label}", ["id:ID", ":LABEL"], rows)
+        command.append(f"--nodes={label}={files}")
+
+    for relationship_type, group in sorted(relationship_groups.items()):
+        rows = []
+        for rel in group:
+            properties = rel if isinstance(rel, dict) else rel.neo4j_properties()
+            rows.append(([rel["source_ref"], rel["target_ref"], relationship_type], properties))
+
+        files = write_import_files(out_dir, f"relationships_{relationship_type}", [":START_ID", ":END_ID", ":TYPE"], rows)
+        command.append(f"--relationships={relationship_type}={files}")
+
+    with open(os.path.join(out_dir, "import.sh"), "w") as f:
+        f.write(" \\\n    ".join(command) + "\n")
+
+    return " ".join(command)
+
+
+def write_import_files(out_dir, name, id_columns, rows):
+    import csv
+    import os
+
+    columns = {}
+    for _, properties in rows:
+        for attr, value in properties.items():
+            if value is not None:
+                columns.setdefault(attr, []).append(value)
+
+    header = id_columns + [f"{attr}:{get_import_type(values)}" for attr, values in columns.items()]
+    header_path = os.path.join(out_dir, f"{name}_header.csv")
+    data_path = os.path.join(out_dir, f"{name}.csv")
+
+    with open(header_path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(header)
+
+    with open(data_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        for ids, properties in rows:
+            writer.writerow(ids + [format_import_value(properties.get(attr)) for attr in columns])
+
+    return f"{header_path},{data_path}"
+
+
+def get_import_type(values):
+    if all(isinstance(value, bool) for value in values):
+        return "boolean"
+    if all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+        return "long"
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+        return "double"
+    if all(isinstance(value, list) for value in values):
+        items = [item for value in values for item in value]
+        if items and all(isinstance(item, (int, float)) and not isinstance(item, bool) for item in items):
+            return "float[]"
+        return "string[]"
+    return "string"
+
+
+def format_import_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, list):
+        return ARRAY_DELIMITER.join(str(item) for item in value)
+    return str(value)
+
+
+def validate(path):
+    from stix2validator import validate_file, print_results
+
+    results = validate_file(path)
+    print_results(results)
+    return results
+
+
+def load_stix_to_neo4j(path, validate_bundle=True):
+    if validate_bundle:
+        validate(path)
+
+    from stix_records import read_records, create_record_indexes
+
+    records = read_records(path)
+
+    with get_driver().session(database=get_db_name()) as session:
+        create_record_indexes(session, [rec.label for rec in records if rec.type not in ("relationship", "x-mitre-collection")])
+        load_sdos(session, records)
+        load_sros(session, records)
+        load_embedded_relationships(session, records)
+
+
+#validation only, loading into Neo4j is "python cli.py load <bundle>"
+if __name__ == "__main__":
+    validate("attack-stix-data/ics-attack-17.1.json")
+    #validate("attack-stix-data/mobile-attack-17.1.json")
+    #validate("attack-stix-data/enterprise-attack-17.1.json")
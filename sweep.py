@@ -0,0 +1,209 @@
+import csv
+import importlib
+import json
+import os
+import re
+import time
+
+
+#retrieve once, answer many: the retrieval stage of every approach runs once per question and its contexts
+#are materialised to JSONL, the answer stage then fans them out to every (model, prompt) pair.
+#Answer calls are grouped by model, so Ollama loads the weights of each model once per sweep
+RETRIEVERS = {"pre": "approach4.pre", "post": "approach4.post", "eval": "Eval_MK.5_eval"}
+DEFAULT_MODELS = ["gemma3:27b-it-qat", "deepseek-r1:1.5b"]
+#reasoning models (deepseek-r1) answer after a <think> block, an unclosed block was cut off and holds no answer
+THINK_PATTERN = re.compile(r"<think>.*?(?:</think>|$)", re.DOTALL)
+
+
+def read_dataset(path):
+    #AttackSeq CSV exports (AttackSeq-*.csv) or AttackSeqBench JSON tasks, with the correct letter if known
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            return [
+                {"question_id": str(item.get("id", i)), "question": item["question"], "choices": item["choices"],
+                 "answer": item.get("answer", "")}
+                for i, item in enumerate(json.load(f))
+            ]
+
+    questions = []
+    with open(path, mode="r", newline="", encoding="utf-8") as infile:
+        for row in csv.DictReader(infile):
+            choices = {letter: row.get(letter, "") for letter in "ABCD"}
+            ground_truth = row.get("Ground Truth", "")
+            answer = next((letter for letter, text in choices.items() if text == ground_truth), ground_truth)
+            questions.append({"question_id": row.get("Question ID", ""), "question": row["Question"],
+                              "choices": choices, "answer": answer})
+    return questions
+
+
+def get_contexts_path(dataset_path):
+    return f"{dataset_path}.contexts.jsonl"
+
+
+def read_contexts(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# --- retrieval stage ---
+
+def retrieve_record(module, retriever, item):
+    from pre_embed import eval_query
+
+    if retriever == "eval":
+        query = eval_query(item["question"], item["choices"])
+        return {"query": query, "cypher": "", **module.retrieve_context(query)}
+
+    a, b, c, d = (item["choices"].get(letter, "") for letter in "ABCD")
+    return module.retrieve_context(item["question"], a, b, c, d)
+
+
+def retrieve_all(dataset_path, retrievers, contexts_path):
+    #appends to an existing contexts file and skips (question, retriever) pairs it already holds,
+    #so an interrupted sweep resumes where it stopped
+    from pre_embed import PrecomputedEmbeddings
+
+    questions = read_dataset(dataset_path)
+    done = {(record["question_id"], record["retriever"]) for record in read_contexts(contexts_path)}
+
+    with open(contexts_path, mode="a", encoding="utf-8") as out:
+        for retriever in retrievers:
+            module = importlib.import_module(RETRIEVERS[retriever])
+            module._resources["precomputed"] = PrecomputedEmbeddings.for_dataset(dataset_path, module.EMBEDDING_MODEL)
+
+            for item in questions:
+                if (item["question_id"], retriever) in done:
+                    continue
+                print(f"---------- {item['question_id']} ({retriever}) ----------")
+                try:
+                    start_time = time.time()
+                    retrieved = retrieve_record(module, retriever, item)
+                    latency = round(time.time() - start_time, 4)
+                except Exception as e:
+                    print(f"Error retrieving {item['question_id']} ({retriever}): {e}")
+                    continue
+
+                record = {**item, "retriever": retriever, **retrieved, "retrieval_latency": latency}
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+
+            cache = module.get_semantic_cache()
+            if cache is not None:
+                print(f"Semantic cache ({retriever}): {cache.stats()}")
+            if "driver" in module._resources:
+                module._resources.pop("driver").close()
+
+    return contexts_path
+
+
+# --- answer stage ---
+
+def strip_thinking(response):
+    return THINK_PATTERN.sub("", response).strip()
+
+
+#approach4 prompt: Cypher query, context and the four options, answer with a single letter
+def ask_approach4(record, llm):
+    from approach4.pre import answer_question
+
+    a, b, c, d = (record["choices"].get(letter, "") for letter in "ABCD")
+    if record["retriever"] == "eval":
+        #the eval query carries the options and the "Final Answer" instruction, this prompt lists the options itself
+        record = {**record, "query": record["question"]}
+    return answer_question(record, a, b, c, d, llm)
+
+
+def parse_approach4(response, record):
+    #same rule as approach4/cleanse.py
+    response = strip_thinking(response)
+    return response[0] if response and response[0] in "ABCD" else ""
+
+
+#5_eval prompt: context as system instruction, question with options and "Final Answer: <letter>" as input
+def ask_eval(record, llm):
+    from pre_embed import eval_query
+
+    module = importlib.import_module("Eval_MK.5_eval")
+    return module.answer_question(eval_query(record["question"], record["choices"]), record["context"], llm)
+
+
+def parse_eval(response, record):
+    module = importlib.import_module("Eval_MK.5_eval")
+    return module.parse_llm_answer(strip_thinking(response), list(record["choices"]))
+
+
+PROMPTS = {"approach4": (ask_approach4, parse_approach4), "eval": (ask_eval, parse_eval)}
+
+
+def answer_all(contexts_path, models, prompts, output_path):
+    from neo4j_graphrag.llm import OllamaLLM
+
+    records = read_contexts(contexts_path)
+    fieldnames = ["Question ID", "Retriever", "Prompt", "Model", "Answer", "Predicted", "Ground Truth", "Latency", "Cache Hit"]
+    rows = []
+
+    with open(output_path, mode="w", newline="", encoding="utf-8") as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+        writer.writeheader()
+
+        for model in models:
+            llm = OllamaLLM(model_name=model)
+            for prompt in prompts:
+                ask, parse = PROMPTS[prompt]
+                for record in records:
+                    try:
+                        start_time = time.time()
+                        response = str(ask(record, llm))
+                        latency = round(time.time() - start_time, 4)
+                    except Exception as e:
+                        print(f"Error answering {record['question_id']} ({model}, {prompt}): {e}")
+                        continue
+
+                    row = {"Question ID": record["question_id"], "Retriever": record["retriever"], "Prompt": prompt,
+                           "Model": model, "Answer": response, "Predicted": parse(response, record),
+                           "Ground Truth": record["answer"], "Latency": latency,
+                           "Cache Hit": record.get("cache_hit", False)}
+                    writer.writerow(row)
+                    outfile.flush()
+                    rows.append(row)
+
+    return rows
+
+
+def summarize(rows):
+    summary = {}
+    for row in rows:
+        key = (row["Retriever"], row["Prompt"], row["Model"])
+        entry = summary.setdefault(key, {"questions": 0, "correct": 0, "latency": 0.0, "cache_hits": 0, "cache_hits_correct": 0})
+        correct = row["Predicted"] == row["Ground Truth"]
+        entry["questions"] += 1
+        entry["correct"] += correct
+        entry["latency"] += row["Latency"]
+        #accuracy on contexts served by the semantic cache vs. the overall accuracy shows the cache's impact
+        if row["Cache Hit"]:
+            entry["cache_hits"] += 1
+            entry["cache_hits_correct"] += correct
+    return summary
+
+
+def print_summary(summary):
+    print(f"{'retriever':<11}{'prompt':<11}{'model':<28}{'questions':>10}{'accuracy':>10}{'s/answer':>10}"
+          f"{'cache hits':>12}{'acc. (hit)':>12}")
+    for (retriever, prompt, model), entry in summary.items():
+        accuracy = entry["correct"] / entry["questions"] * 100
+        hit_rate = entry["cache_hits"] / entry["questions"] * 100
+        hit_accuracy = f"{entry['cache_hits_correct'] / entry['cache_hits'] * 100:.2f}%" if entry["cache_hits"] else "-"
+        print(f"{retriever:<11}{prompt:<11}{model:<28}{entry['questions']:>10}{accuracy:>9.2f}%"
+              f"{entry['latency'] / entry['questions']:>10.2f}{hit_rate:>11.2f}%{hit_accuracy:>12}")
+
+
+def run_sweep(dataset_path, retrievers, models, prompts, output_path, contexts_path=None, skip_retrieval=False):
+    contexts_path = contexts_path or get_contexts_path(dataset_path)
+    if not skip_retrieval:
+        retrieve_all(dataset_path, retrievers, contexts_path)
+
+    summary = summarize(answer_all(contexts_path, models, prompts, output_path))
+    print_summary(summary)
+    return summary
@@ -0,0 +1,233 @@
+import json
+import random
+import uuid
+
+
+#generates ATT&CK-shaped STIX 2.1 bundles of configurable size for loader benchmarks
+#object counts at scale 1.0 roughly match the enterprise-attack 17.1 bundle
+ENTERPRISE_OBJECT_COUNTS = {
+    "technique": 211,
+    "subtechnique": 468,
+    "course-of-action": 268,
+    "intrusion-set": 165,
+    "malware": 670,
+    "tool": 88,
+    "campaign": 45,
+    "x-mitre-data-source": 38,
+    "x-mitre-data-component": 106,
+}
+
+#relationships per scale 1.0, subtechnique-of is derived from the sub-techniques
+ENTERPRISE_RELATIONSHIP_COUNTS = {
+    "uses": 16200,
+    "mitigates": 1420,
+    "detects": 2100,
+    "attributed-to": 40,
+    "revoked-by": 140,
+}
+
+ENTERPRISE_TACTICS = [
+    "reconnaissance", "resource-development", "initial-access", "execution", "persistence",
+    "privilege-escalation", "defense-evasion", "credential-access", "discovery", "lateral-movement",
+    "collection", "command-and-control", "exfiltration", "impact",
+]
+
+PLATFORMS = ["Windows", "Linux", "macOS", "Network Devices", "Containers", "IaaS", "SaaS", "Office Suite", "Identity Provider", "ESXi"]
+
+WORDS = ("adversaries may abuse system process command network credential registry service file payload "
+         "execution persistence discovery remote access token memory script download host user account").split()
+
+IDENTITY_ID = "identity--c78cb6e5-0c4b-4611-8297-d1b8b55e40b5"
+MARKING_ID = "marking-definition--fa42a846-8d90-4e51-bc29-71d5b4802168"
+
+
+def generate_bundle(scale=1.0, seed=0):
+    rng = random.Random(seed)
+
+    def new_id(stix_type):
+        return f"{stix_type}--{uuid.UUID(int=rng.getrandbits(128), version=4)}"
+
+    def timestamp():
+        return f"20{rng.randint(17, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00.000Z"
+
+    def created_modified():
+        #STIX requires modified >= created, the fixed-width timestamps sort as strings
+        return sorted((timestamp(), timestamp()))
+
+    def description(length):
+        text = " ".join(rng.choice(WORDS) for _ in range(length)).capitalize()
+        return f"{text}. (Citation: Synthetic Report {rng.randint(1, 5000)})"
+
+    def base_object(stix_type, name, external_id=None, url_path=None):
+        created, modified = created_modified()
+        obj = {
+            "type": stix_type,
+            "spec_version": "2.1",
+            "id": new_id(stix_type),
+            "created": created,
+            "created_by_ref": IDENTITY_ID,
+            "revoked": False,
+            "external_references": [],
+            "object_marking_refs": [MARKING_ID],
+            "modified": modified,
+            "name": name,
+            "description": description(rng.randint(20, 120)),
+            "x_mitre_attack_spec_version": "3.2.0",
+            "x_mitre_deprecated": False,
+            "x_mitre_domains": ["enterprise-attack"],
+            "x_mitre_modified_by_ref": IDENTITY_ID,
+            "x_mitre_version": "1.0",
+        }
+        if external_id:
+            obj["external_references"].append({
+                "source_name": "mitre-attack",
+                "url": f"https://attack.mitre.org/{url_path}/{external_id.replace('.', '/')}",
+                "external_id": external_id,
+            })
+        for _ in range(rng.randint(0, 4)):
+            obj["external_references"].append({
+                "source_name": f"Synthetic Report {rng.randint(1, 5000)}",
+                "description": description(10),
+                "url": f"https://example.org/report/{rng.getrandbits(32):x}",
+            })
+        if not obj["external_references"]:
+            #empty lists are invalid STIX
+            del obj["external_references"]
+        return obj
+
+    def count(name):
+        return max(1, round(ENTERPRISE_OBJECT_COUNTS[name] * scale))
+
+    objects = [
+        {"type": "identity", "spec_version": "2.1", "id": IDENTITY_ID, "created": "2017-06-01T00:00:00.000Z",
+         "modified": "2025-03-19T15:00:40.855Z", "name": "The MITRE Corporation", "identity_class": "organization",
+         "object_marking_refs": [MARKING_ID], "x_mitre_attack_spec_version": "3.2.0"},
+        {"type": "marking-definition", "spec_version": "2.1", "id": MARKING_ID, "created": "2017-06-01T00:00:00.000Z",
+         "created_by_ref": IDENTITY_ID, "definition_type": "statement",
+         "definition": {"statement": "Synthetic ATT&CK-shaped data for benchmarks."}},
+    ]
+
+    tactics = []
+    for i, shortname in enumerate(ENTERPRISE_TACTICS):
+        tactic = base_object("x-mitre-tactic", shortname.replace("-", " ").title(), f"TA{i + 1:04d}", "tactics")
+        tactic["x_mitre_shortname"] = shortname
+        tactics.append(tactic)
+
+    matrix = base_object("x-mitre-matrix", "Enterprise ATT&CK", "enterprise-attack", "matrices")
+    matrix["tactic_refs"] = [tactic["id"] for tactic in tactics]
+    objects += tactics + [matrix]
+
+    techniques = []
+    for i in range(count("technique")):
+        technique = base_object("attack-pattern", f"Technique {i}", f"T{1000 + i}", "techniques")
+        technique["kill_chain_phases"] = [
+            {"kill_chain_name": "mitre-attack", "phase_name": phase}
+            for phase in rng.sample(ENTERPRISE_TACTICS, rng.choice((1, 1, 1, 2, 3)))
+        ]
+        technique["x_mitre_platforms"] = rng.sample(PLATFORMS, rng.randint(1, 4))
+        technique["x_mitre_is_subtechnique"] = False
+        techniques.append(technique)
+
+    relationships = []
+
+    def relationship(relationship_type, source, target):
+        created, modified = created_modified()
+        return {
+            "type": "relationship",
+            "spec_version": "2.1",
+            "id": new_id("relationship"),
+            "created": created,
+            "created_by_ref": IDENTITY_ID,
+            "revoked": False,
+            "object_marking_refs": [MARKING_ID],
+            "modified": modified,
+            "description": description(rng.randint(0, 40)) if relationship_type in ("uses", "mitigates") else "",
+            "relationship_type": relationship_type,
+            "source_ref": source["id"],
+            "target_ref": target["id"],
+            "x_mitre_attack_spec_version": "3.2.0",
+            "x_mitre_deprecated": False,
+            "x_mitre_modified_by_ref": IDENTITY_ID,
+        }
+
+    subtechniques = []
+    for i in range(count("subtechnique")):
+        parent = rng.choice(techniques)
+        parent_id = parent["external_references"][0]["external_id"]
+        subtechnique = base_object("attack-pattern", f"Sub-technique {i}", f"{parent_id}.{i % 1000:03d}", "techniques")
+        subtechnique["kill_chain_phases"] = parent["kill_chain_phases"]
+        subtechnique["x_mitre_platforms"] = parent["x_mitre_platforms"]
+        subtechnique["x_mitre_is_subtechnique"] = True
+        subtechniques.append(subtechnique)
+        relationships.append(relationship("subtechnique-of", subtechnique, parent))
+
+    attack_patterns = techniques + subtechniques
+    objects += attack_patterns
+
+    groups = {}
+    for stix_type, prefix, url_path in (
+        ("course-of-action", "M", "mitigations"),
+        ("intrusion-set", "G", "groups"),
+        ("malware", "S", "software"),
+        ("tool", "S", "software"),
+        ("campaign", "C", "campaigns"),
+        ("x-mitre-data-source", "DS", "datasources"),
+        ("x-mitre-data-component", None, None),
+    ):
+        groups[stix_type] = []
+        for i in range(count(stix_type)):
+            external_id = f"{prefix}{i:04d}" if prefix else None
+            obj = base_object(stix_type, f"{stix_type.replace('-', ' ').title()} {i}", external_id, url_path)
+            if stix_type in ("malware", "tool"):
+                obj["x_mitre_platforms"] = rng.sample(PLATFORMS, rng.randint(1, 3))
+                obj["x_mitre_aliases"] = [obj["name"]]
+            if stix_type == "malware":
+                obj["is_family"] = True
+            if stix_type == "intrusion-set":
+                obj["aliases"] = [obj["name"]]
+            groups[stix_type].append(obj)
+        objects += groups[stix_type]
+
+    for component in groups["x-mitre-data-component"]:
+        component["x_mitre_data_source_ref"] = rng.choice(groups["x-mitre-data-source"])["id"]
+
+    users = groups["intrusion-set"] + groups["campaign"] + groups["malware"] + groups["tool"]
+    software = groups["malware"] + groups["tool"]
+    relationship_sources = {
+        "uses": lambda: (rng.choice(users), rng.choice(attack_patterns + software)),
+        "mitigates": lambda: (rng.choice(groups["course-of-action"]), rng.choice(attack_patterns)),
+        "detects": lambda: (rng.choice(groups["x-mitre-data-component"]), rng.choice(attack_patterns)),
+        "attributed-to": lambda: (rng.choice(groups["campaign"]), rng.choice(groups["intrusion-set"])),
+        "revoked-by": lambda: (rng.choice(attack_patterns), rng.choice(attack_patterns)),
+    }
+    for relationship_type, relationship_count in ENTERPRISE_RELATIONSHIP_COUNTS.items():
+        for _ in range(max(1, round(relationship_count * scale))):
+            relationships.append(relationship(relationship_type, *relationship_sources[relationship_type]()))
+
+    objects += relationships
+    objects.append({
+        "type": "x-mitre-collection",
+        "id": new_id("x-mitre-collection"),
+        "spec_version": "2.1",
+        "name": "Synthetic Enterprise ATT&CK",
+        "x_mitre_version": "17.1",
+        "created_by_ref": IDENTITY_ID,
+        "created": "2017-06-01T00:00:00.000Z",
+        "modified": "2025-05-06T14:00:00.000Z",
+        "x_mitre_contents": [{"object_ref": obj["id"], "object_modified": obj.get("modified", obj["created"])} for obj in objects],
+        "object_marking_refs": [MARKING_ID],
+    })
+
+    return {"type": "bundle", "id": new_id("bundle"), "objects": objects}
+
+
+def write_bundle(path, scale=1.0, seed=0):
+    bundle = generate_bundle(scale, seed)
+    with open(path, "w") as f:
+        json.dump(bundle, f)
+    return len(bundle["objects"])
+
+
+if __name__ == "__main__":
+    for scale in (1, 10, 100):
+        print(f"{scale}x:", write_bundle(f"synthetic-enterprise-{scale}x.json", scale), "objects")
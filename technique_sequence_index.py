@@ -0,0 +1,196 @@
+import json
+from itertools import combinations
+
+from attack_constants import TECHNIQUE_ID_PATTERN
+from stix_graph_snapshot import build_snapshot
+
+
+#precomputed index for AttackSeq "what happened before/after" questions
+#tactic order comes from the matrix tactic_refs, technique membership from ContainsTechnique (kill_chain_phases)
+#and co-occurrence counts from the techniques intrusion sets and campaigns use
+def build_sequence_index(snapshot):
+    tactic_order = {}
+    tactic_position = {}
+    technique_tactics = {}
+    tactic_techniques = {}
+    technique_names = {}
+    technique_domains = {}
+    parents = {}
+    co_occurrence = {}
+    usage_count = {}
+
+    for i in range(snapshot.node_count):
+        node = snapshot.node(i)
+
+        if node["type"] == "x-mitre-matrix":
+            tactics = [tactic["name"] for tactic, _ in snapshot.neighbors(node["id"], ["ReferencesTactic"], "out")]
+            for domain in node["domains"].split(","):
+                #a domain can have several matrices, e.g. "Network-Based Effects" next to "Mobile ATT&CK", the full one wins
+                if domain and len(tactics) > len(tactic_order.get(domain, [])):
+                    tactic_order[domain] = tactics
+
+        elif node["type"] == "attack-pattern" and node["attack_id"]:
+            technique_names[node["attack_id"]] = node["name"]
+            technique_domains[node["attack_id"]] = [domain for domain in node["domains"].split(",") if domain]
+            parent = snapshot.parent_technique(node["id"])
+            if parent and parent["attack_id"]:
+                parents[node["attack_id"]] = parent["attack_id"]
+
+            for tactic in snapshot.tactics(node["id"]):
+                technique_tactics.setdefault(node["attack_id"], [])
+                if tactic["name"] not in technique_tactics[node["attack_id"]]:
+                    technique_tactics[node["attack_id"]].append(tactic["name"])
+                tactic_techniques.setdefault(tactic["name"], set()).add(node["attack_id"])
+
+        elif node["type"] in ("intrusion-set", "campaign"):
+            used = set()
+            for technique, _ in snapshot.neighbors(node["id"], ["Uses"], "out"):
+                if technique["type"] == "attack-pattern" and technique["attack_id"]:
+                    used.add(technique["attack_id"])
+                    #a group using a sub-technique also counts as using its parent technique
+                    parent = snapshot.parent_technique(technique["id"])
+                    if parent and parent["attack_id"]:
+                        used.add(parent["attack_id"])
+
+            for technique_id in used:
+                usage_count[technique_id] = usage_count.get(technique_id, 0) + 1
+            for a, b in combinations(sorted(used), 2):
+                co_occurrence.setdefault(a, {})
+                co_occurrence.setdefault(b, {})
+                co_occurrence[a][b] = co_occurrence[a].get(b, 0) + 1
+                co_occurrence[b][a] = co_occurrence[b].get(a, 0) + 1
+
+    for domain, tactics in tactic_order.items():
+        for position, tactic_name in enumerate(tactics):
+            tactic_position.setdefault(tactic_name.lower(), {})[domain] = position
+
+    return SequenceIndex({
+        "tactic_order": tactic_order,
+        "tactic_position": tactic_position,
+        "technique_tactics": technique_tactics,
+        "tactic_techniques": {name: sorted(ids) for name, ids in tactic_techniques.items()},
+        "technique_names": technique_names,
+        "technique_domains": technique_domains,
+        "parents": parents,
+        "co_occurrence": co_occurrence,
+        "usage_count": usage_count,
+    })
+
+
+def build_sequence_index_from_bundles(paths):
+    return build_sequence_index(build_snapshot(paths))
+
+
+def load_sequence_index(path):
+    with open(path, encoding="utf-8") as f:
+        return SequenceIndex(json.load(f))
+
+
+class SequenceIndex:
+
+    def __init__(self, data):
+        self.data = data
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+
+    def tactic_position(self, tactic_name, domain="enterprise-attack"):
+        #tactic names repeat across domains (Initial Access, Execution, ...), positions are only valid per domain
+        return self.data["tactic_position"].get(tactic_name.lower(), {}).get(domain)
+
+    def neighbouring_tactics(self, tactic_name, domain="enterprise-attack"):
+        #returns (tactic before, tactic after) in kill-chain order of the domain
+        position = self.tactic_position(tactic_name, domain)
+        tactics = self.data["tactic_order"].get(domain, [])
+        if position is None or not tactics:
+            return None, None
+        before = tactics[position - 1] if position > 0 else None
+        after = tactics[position + 1] if position + 1 < len(tactics) else None
+        return before, after
+
+    def tactics_of(self, technique_id):
+        return self.data["technique_tactics"].get(technique_id) \
+            or self.data["technique_tactics"].get(self.data["parents"].get(technique_id), [])
+
+    def domains_of(self, technique_id):
+        technique_domains = self.data.get("technique_domains", {})
+        return technique_domains.get(technique_id) \
+            or technique_domains.get(self.data["parents"].get(technique_id), [])
+
+    def infer_domain(self, options, default_domain="enterprise-attack"):
+        #the domain most option techniques belong to, otherwise the domain whose kill chain holds every tactic option;
+        #default_domain only breaks ties between domains that hold them all, None if the domain stays unknown
+        counts = {}
+        tactic_options = []
+        for option in options:
+            match = TECHNIQUE_ID_PATTERN.search(option)
+            if match:
+                for domain in self.domains_of(match.group(1)):
+                    counts[domain] = counts.get(domain, 0) + 1
+            elif option:
+                tactic_options.append(option)
+
+        if counts:
+            return max(sorted(counts), key=counts.get)
+        candidates = [
+            domain for domain in sorted(self.data["tactic_order"])
+            if tactic_options and all(self.tactic_position(option, domain) is not None for option in tactic_options)
+        ]
+        if len(candidates) == 1:
+            return candidates[0]
+        return default_domain if default_domain in candidates else None
+
+    def techniques_of(self, tactic_name):
+        return self.data["tactic_techniques"].get(tactic_name, [])
+
+    def co_occurrence(self, technique_a, technique_b):
+        return self.data["co_occurrence"].get(technique_a, {}).get(technique_b, 0)
+
+    def top_co_occurring(self, technique_id, tactic_name=None, limit=5):
+        counts = self.data["co_occurrence"].get(technique_id, {})
+        candidates = self.techniques_of(tactic_name) if tactic_name else counts
+        ranked = sorted(((counts.get(other, 0), other) for other in candidates if other != technique_id), reverse=True)
+        return [(other, count) for count, other in ranked[:limit] if count > 0]
+
+    #compact retrieval context for AttackSeq questions: kill-chain position of every answer option
+    #and how often the option techniques are used together by the same groups
+    #the domain is inferred from the options unless given, kill-chain steps are left out if it stays unknown
+    def sequence_context(self, options, domain=None):
+        domain = domain or self.infer_domain(options)
+        lines = []
+        if domain in self.data["tactic_order"]:
+            lines.append(f"Tactic order ({domain}): " + " -> ".join(self.data["tactic_order"][domain]))
+
+        technique_ids = []
+        for option in options:
+            match = TECHNIQUE_ID_PATTERN.search(option)
+            if match:
+                technique_id = match.group(1)
+                technique_ids.append(technique_id)
+                tactics = ", ".join(
+                    f"{tactic} (step {self.tactic_position(tactic, domain) + 1})" if self.tactic_position(tactic, domain) is not None else tactic
+                    for tactic in self.tactics_of(technique_id)
+                )
+                name = self.data["technique_names"].get(technique_id, option)
+                lines.append(f"{technique_id} {name}: tactics {tactics or 'unknown'}; used by {self.data['usage_count'].get(technique_id, 0)} groups/campaigns")
+            else:
+                position = self.tactic_position(option, domain)
+                if position is not None:
+                    before, after = self.neighbouring_tactics(option, domain)
+                    lines.append(f"{option}: step {position + 1}, before it {before or '-'}, after it {after or '-'}")
+
+        for a, b in combinations(technique_ids, 2):
+            count = self.co_occurrence(a, b)
+            if count:
+                lines.append(f"{a} and {b} are used together by {count} groups/campaigns")
+
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    build_sequence_index_from_bundles([
+        "attack-stix-data/ics-attack-17.1.json",
+        "attack-stix-data/mobile-attack-17.1.json",
+        #"attack-stix-data/enterprise-attack-17.1.json",
+    ]).save("attack-sequence-index.json")